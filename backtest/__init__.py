@@ -1,2 +1,6 @@
-__all__ = ['Backtest']
-from .backtest import *
\ No newline at end of file
+__all__ = ['Backtest', 'VectorizedBacktest', 'VectorizedResult', 'BarArrays', 'signals_to_positions',
+           'compare_results', 'check_parity', 'ParameterSweep', 'parameter_grid']
+from .backtest import *
+from .vectorized import *
+from .parity import *
+from .sweep import *
\ No newline at end of file
@@ -6,48 +6,88 @@ from __future__ import print_function
 
 import datetime
 import pprint
-try:
-    import Queue as queue
-except ImportError:
-    import queue
 import time
 
+from data import NANOS_PER_SECOND
+from event import EventBus, MarketEvent, SignalEvent, OrderEvent, FillEvent
+from performance import create_sharpe_ratio, create_drawdowns
+from portfolio import History
+
 
 class Backtest(object):
     """
     事件驱动回测系统
     """
     def __init__(self, csv_dir, symbol_list, initial_capital, heartbeat, start_date, data_handler, execution_handler,
-                 portfolio, strategy):
+                 portfolio, strategy, mode='historical', speed=1.0, max_sleep=0.0, report_every=100000,
+                 report_interval=10.0, event_bus=EventBus):
         """
         初始化
         Parameters:
         csv_dir - csv文件所在文件夹的路径
         symbol_list - 品种标签列表，采用csv文件名
         intial_capital - 初始资金
-        heartbeat - 停顿，/秒
+        heartbeat - 已不再使用，保留该位置参数以兼容原有的调用。historical模式不停顿；
+                    realtime模式只按行情时间戳停顿，见speed、max_sleep
         start_date - 开始时间
         data_handler - (Class) DataHandler，数据接收
         execution_handler - (Class) ExecutionHandler， 处理订单成交
         portfolio - (Class) Portfolio，更新头寸和市值
-        strategy - (Class) Strategy，根据接收到的数据，生成信号
+        strategy - (Class) Strategy，根据接收到的数据，生成信号。
+                   也可以是策略列表，每项为Strategy类或(Strategy类, 参数dict)，各策略在同一次行情回放中运行，
+                   strategy_id依次为1, 2, ...，每个策略有自己的Portfolio子账户（初始资金均为initial_capital）
+        mode - 'historical'：历史回放，不停顿，尽快跑完；
+               'realtime'：按行情时间戳之间的间隔停顿，模拟实盘节奏
+        speed - realtime模式的回放倍速，2.0即以两倍速回放
+        max_sleep - realtime模式下单次停顿的上限，/秒，用于跳过午休、夜盘间隔等长时间空档；0为不设上限
+        report_every - 每处理多少条行情输出一次进度
+        report_interval - 距上次输出超过多少秒时也输出一次进度
+        event_bus - (Class) 事件总线，默认单线程的EventBus，接入实盘行情线程时用ThreadSafeEventBus
         """
+        if mode not in ('historical', 'realtime'):
+            raise ValueError("mode must be 'historical' or 'realtime', got %r" % mode)
         self.csv_dir = csv_dir
         self.symbol_list = symbol_list
         self.initial_capital = initial_capital
         self.heartbeat = heartbeat
+        self.mode = mode
+        self.speed = speed
+        self.max_sleep = max_sleep
+        self.report_every = report_every
+        self.report_interval = report_interval
         self.start_date = start_date
         self.data_handler_cls = data_handler
         self.execution_handler_cls = execution_handler
         self.portfolio_cls = portfolio
         self.strategy_cls = strategy
-        self.events = queue.Queue()
+        self.events = event_bus()
         self.signals = 0
         self.orders = 0
         self.fills = 0
-        self.num_strats = 1
+        # 回测结束后的统计总结，见Portfolio.output_summary_stats；多个策略时为合计账户的统计，各策略的统计见strategy_stats
+        self.stats = None
+        self.strategy_stats = {}
+        self.strategy_configs = self._strategy_configs(strategy)
+        self.num_strats = len(self.strategy_configs)
         self._generate_trading_instances()
 
+    @staticmethod
+    def _strategy_configs(strategy):
+        """
+        将strategy参数统一为[(Strategy类, 参数dict)]
+        """
+
+        strategies = strategy if isinstance(strategy, list) else [strategy]
+        configs = []
+        for config in strategies:
+            if isinstance(config, tuple):
+                configs.append((config[0], dict(config[1]) if len(config) > 1 else {}))
+            else:
+                configs.append((config, {}))
+        if not configs:
+            raise ValueError("At least one strategy is required")
+        return configs
+
     def _generate_trading_instances(self):
         """
         生成回测中的各类实例对象
@@ -55,9 +95,85 @@ class Backtest(object):
 
         print("Creating DataHandler, Strategy, Portfolio and ExecutionHandler")
         self.data_handler = self.data_handler_cls(self.events, self.csv_dir, self.symbol_list)
-        self.strategy = self.strategy_cls(self.data_handler, self.events)
-        self.portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, self.initial_capital)
+        self.strategies = []
+        self.portfolios = []
+        for strategy_id, (strategy_cls, kwargs) in enumerate(self.strategy_configs, 1):
+            strategy = strategy_cls(self.data_handler, self.events, **kwargs)
+            strategy.strategy_id = strategy_id
+            self.strategies.append(strategy)
+            if self.num_strats == 1:
+                portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, self.initial_capital)
+            else:
+                portfolio = self.portfolio_cls(self.data_handler, self.events, self.start_date, self.initial_capital,
+                                               strategy_id=strategy_id)
+            self.portfolios.append(portfolio)
+        self.strategy = self.strategies[0]
+        self.portfolio = self.portfolios[0]
         self.execution_handler = self.execution_handler_cls(self.events)
+        # 多个策略时，各子账户每条行情的合计现金、手续费和市值
+        self.aggregate = None
+        if self.num_strats > 1:
+            capital = self.initial_capital * self.num_strats
+            self.aggregate = History(['cash', 'commission', 'total'])
+            self.aggregate.append(self.portfolio.start_time, [capital, 0.0, capital])
+        self._subscribe_handlers()
+
+    def _subscribe_handlers(self):
+        """
+        在事件总线上注册各事件的处理函数。MarketEvent先交给各Strategy生成信号，再交给各Portfolio更新市值，
+        最后汇总合计账户
+        """
+
+        self.events.subscribe(SignalEvent, self._count_signal)
+        self.events.subscribe(OrderEvent, self._count_order)
+        self.events.subscribe(FillEvent, self._count_fill)
+        for strategy in self.strategies:
+            strategy.subscribe(self.events)
+        for portfolio in self.portfolios:
+            portfolio.subscribe(self.events)
+        if self.aggregate is not None:
+            self.events.subscribe(MarketEvent, self._update_aggregate)
+        self.execution_handler.subscribe(self.events)
+
+    def _count_signal(self, event):
+        self.signals += 1
+
+    def _count_order(self, event):
+        self.orders += 1
+
+    def _count_fill(self, event):
+        self.fills += 1
+
+    def _update_aggregate(self, event):
+        """
+        记录各子账户在本条行情的合计，此时各Portfolio已按最新价格计算了市值
+        """
+
+        cash = commission = total = 0.0
+        for portfolio in self.portfolios:
+            cash += portfolio.current_holdings['cash']
+            commission += portfolio.current_holdings['commission']
+            # 最新一次update_timeindex计算的市值
+            total += portfolio.metrics.last_value
+        self.aggregate.append(self.data_handler.get_latest_bar_datetime(self.symbol_list[0]),
+                              [cash, commission, total])
+
+    def create_aggregate_equity_curve(self):
+        """
+        根据合计账户的历史，计算权益曲线dataframe和统计总结，格式与Portfolio一致
+        """
+
+        curve = self.aggregate.frame()
+        curve['returns'] = curve['total'].pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+        drawdown, max_dd, dd_duration = create_drawdowns(curve['equity_curve'])
+        sharpe_ratio = create_sharpe_ratio(curve['returns'], periods=self.portfolio.PERIODS)
+        curve['drawdown'] = drawdown
+        self.equity_curve = curve
+        return [("Total Return", "%0.2f%%" % ((curve['equity_curve'].iloc[-1] - 1.0) * 100.0)),
+                ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
+                ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
+                ("Drawdown Duration", "%d" % dd_duration)]
 
     def _run_backtest(self):
         """
@@ -65,49 +181,74 @@ class Backtest(object):
         """
 
         i = 0
+        start = last_report = time.time()
+        next_report = self.report_every
+        # realtime模式下，上一条行情的时间戳和处理完毕时的时钟时间
+        last_tick_time = None
+        last_wall = start
         while True:
             i += 1
-            print(i)
             # 接收数据
             if self.data_handler.continue_backtest == True:
                 self.data_handler.update_bars()
             else:
                 break
+            if self.mode == 'realtime':
+                tick_time = self.data_handler.get_latest_bar_datetime(self.symbol_list[0])
+                if last_tick_time is not None:
+                    self._wait_for_tick(tick_time - last_tick_time, last_wall)
+                last_tick_time = tick_time
+                last_wall = time.time()
             # 处理事件Events
-            while True:
-                try:
-                    event = self.events.get(False)
-                except queue.Empty:
-                    break
-                else:
-                    if event is not None:
-                        if event.type == 'MARKET':
-                            self.strategy.calculate_signals(event)
-                            self.portfolio.update_timeindex(event)
-                        elif event.type == 'SIGNAL':
-                            self.signals += 1
-                            self.portfolio.update_signal(event)
-                        elif event.type == 'ORDER':
-                            self.orders += 1
-                            self.execution_handler.execute_order(event)
-                        elif event.type == 'FILL':
-                            self.fills += 1
-                            self.portfolio.update_fill(event)
-            time.sleep(self.heartbeat)
+            self.events.dispatch()
+            # 输出进度
+            now = time.time()
+            if i >= next_report or now - last_report >= self.report_interval:
+                print("Ticks: %d, %.0f ticks/sec" % (i, i / max(now - start, 1e-9)))
+                next_report = i + self.report_every
+                last_report = now
+        elapsed = time.time() - start
+        print("Processed %d ticks in %.1fs, %.0f ticks/sec" % (i - 1, elapsed, (i - 1) / max(elapsed, 1e-9)))
+
+    def _wait_for_tick(self, gap, last_wall):
+        """
+        realtime模式下，按两条行情的时间间隔停顿，扣除处理上一条行情已花费的时间
+        Parameters:
+        gap - 两条行情的时间戳之差，纳秒
+        last_wall - 上一条行情处理完毕时的时钟时间
+        """
+
+        delay = gap / float(NANOS_PER_SECOND) / self.speed
+        if self.max_sleep:
+            delay = min(delay, self.max_sleep)
+        delay -= time.time() - last_wall
+        if delay > 0:
+            time.sleep(delay)
 
     def _output_performance(self):
         """
         输出回测情况
         """
 
-        self.portfolio.create_equity_curve_dataframe()
+        for strategy_id, portfolio in enumerate(self.portfolios, 1):
+            portfolio.create_equity_curve_dataframe()
+
+            print("Creating summary stats...")
+            stats = portfolio.output_summary_stats()
+            self.strategy_stats[strategy_id] = stats
 
-        print("Creating summary stats...")
-        stats = self.portfolio.output_summary_stats()
+            print("Creating equity curve...")
+            if self.num_strats > 1:
+                print("Strategy %d: %s" % (strategy_id, self.strategies[strategy_id - 1].__class__.__name__))
+            print(portfolio.equity_curve.tail(10))
+            pprint.pprint(stats)
 
-        print("Creating equity curve...")
-        print(self.portfolio.equity_curve.tail(10))
-        pprint.pprint(stats)
+        if self.num_strats > 1:
+            print("Creating aggregate equity curve...")
+            stats = self.create_aggregate_equity_curve()
+            print(self.equity_curve.tail(10))
+            pprint.pprint(stats)
+        self.stats = stats
 
         print("Signals: %s" % self.signals)
         print("Orders: %s" % self.orders)
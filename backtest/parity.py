@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# parity.py
+
+from __future__ import print_function
+
+import functools
+
+import numpy as np
+
+from execution import SimulatedExecutionHandler
+from portfolio import Portfolio
+from .backtest import Backtest
+from .vectorized import VectorizedBacktest
+
+
+def _first_mismatch(a, b, rtol):
+    """
+    返回两个等长数组第一处不一致的位置，NaN与NaN视为一致；一致时返回None
+    """
+
+    if a.dtype.kind in 'fc' or b.dtype.kind in 'fc':
+        same = np.isclose(a, b, rtol=rtol, atol=0.0, equal_nan=True)
+    else:
+        same = a == b
+    if same.ndim > 1:
+        same = same.all(axis=tuple(range(1, same.ndim)))
+    bad = np.flatnonzero(~same)
+    return bad[0] if len(bad) else None
+
+
+def compare_results(portfolio, result, signals, rtol=1e-9):
+    """
+    比较事件驱动回测的Portfolio与VectorizedResult，返回差异说明的列表，一致时为空列表
+    Parameters:
+    portfolio - 以record='tick'运行完毕的Portfolio
+    result - VectorizedResult
+    signals - 事件驱动回测的信号个数，即Backtest.signals
+    rtol - 市值比较的相对误差
+    """
+
+    divergences = []
+    if signals != result.signals:
+        divergences.append("signals: event %d, vectorized %d" % (signals, result.signals))
+
+    # 成交记录，同一时间的成交按品种排序后比较
+    fills = list(zip(*portfolio.fills)) or [[]] * 6
+    event_fills = [np.array(fills[0], dtype=np.int64), np.array(fills[1], dtype=str),
+                   np.array(fills[2], dtype=np.int8), np.array(fills[3], dtype=np.float64),
+                   np.array(fills[4], dtype=np.float64), np.array(fills[5], dtype=np.float64)]
+    vector_fills = [result.fills[k] for k in ('datetime', 'symbol', 'direction', 'quantity', 'price', 'commission')]
+    if len(event_fills[0]) != len(vector_fills[0]):
+        divergences.append("fills: event %d, vectorized %d" % (len(event_fills[0]), len(vector_fills[0])))
+    n = min(len(event_fills[0]), len(vector_fills[0]))
+    event_order = np.lexsort((event_fills[1][:n], event_fills[0][:n]))
+    vector_order = np.lexsort((vector_fills[1][:n], vector_fills[0][:n]))
+    for name, a, b in zip(('datetime', 'symbol', 'direction', 'quantity', 'price', 'commission'),
+                          event_fills, vector_fills):
+        i = _first_mismatch(a[:n][event_order], b[:n][vector_order], rtol)
+        if i is not None:
+            divergences.append("fill %d %s: event %s, vectorized %s"
+                               % (i, name, a[:n][event_order][i], b[:n][vector_order][i]))
+
+    # 头寸与市值历史，逐条行情比较
+    positions = portfolio.all_positions.frame()
+    holdings = portfolio.all_holdings.frame()
+    if len(holdings) != len(result.holdings):
+        divergences.append("records: event %d, vectorized %d" % (len(holdings), len(result.holdings)))
+    n = min(len(holdings), len(result.holdings))
+    checks = [('datetime', holdings.index.to_numpy()[:n], result.datetime[:n]),
+              ('positions', positions.to_numpy()[:n], result.positions[:n])]
+    for k, col in enumerate(holdings.columns):
+        checks.append((col, holdings[col].to_numpy()[:n], result.holdings[:n, k]))
+    for name, a, b in checks:
+        i = _first_mismatch(a, b, rtol)
+        if i is not None:
+            divergences.append("record %d %s: event %s, vectorized %s" % (i, name, a[i], b[i]))
+    return divergences
+
+
+def check_parity(csv_dir, symbol_list, initial_capital, start_date, data_handler, strategy, vectorized_strategy,
+                 params=None, rtol=1e-9):
+    """
+    以同一组参数分别运行事件驱动回测（Backtest.simulate_trading）和向量化回测，输出并返回二者的差异
+    Parameters:
+    csv_dir, symbol_list, initial_capital, start_date, data_handler - 见Backtest
+    strategy - (Class) Strategy，事件驱动的策略
+    vectorized_strategy - (Class) VectorizedStrategy，同一策略的向量化实现
+    params - 两个策略共同的参数dict
+    rtol - 市值比较的相对误差
+    Returns - (Backtest, VectorizedResult, 差异说明的列表)
+    """
+
+    params = params or {}
+    backtest = Backtest(csv_dir, symbol_list, initial_capital, 0.0, start_date, data_handler,
+                        SimulatedExecutionHandler, functools.partial(Portfolio, results=None),
+                        functools.partial(strategy, **params))
+    backtest.simulate_trading()
+    result = VectorizedBacktest(csv_dir, symbol_list, initial_capital, start_date, data_handler,
+                                vectorized_strategy).run(**params)
+    divergences = compare_results(backtest.portfolio, result, backtest.signals, rtol)
+    if divergences:
+        print("Parity check found %d divergences:" % len(divergences))
+        for line in divergences:
+            print("  %s" % line)
+    else:
+        print("Parity check passed: %d signals, %d fills, %d records"
+              % (result.signals, len(result.fills['datetime']), len(result.holdings)))
+    return backtest, result, divergences
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+# sweep.py
+
+from __future__ import print_function
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import functools
+import itertools
+import os
+import time
+
+import pandas as pd
+
+from event import EventBus
+from performance import ResultsWriter
+from .backtest import Backtest
+
+
+def parameter_grid(grid):
+    """
+    展开参数网格
+    Parameters:
+    grid - {参数名: 取值列表}，返回全部组合；或[参数dict]，原样返回
+    Returns - [参数dict]
+    """
+
+    if isinstance(grid, dict):
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*[grid[k] for k in names])]
+    return [dict(params) for params in grid]
+
+
+def _run_backtest(config, run, params):
+    """
+    进程池中执行：以params为策略参数运行一次Backtest，返回一行统计结果。
+    DataHandler命中主进程写好的TickCache，以内存映射方式读取行情
+    """
+
+    (csv_dir, symbol_list, initial_capital, start_date, data_handler, execution_handler, portfolio, strategy,
+     record, results_dir) = config
+    results = ResultsWriter(results_dir, run_name='run-%05d' % run) if results_dir is not None else None
+    start = time.time()
+    # 回测过程中的输出（进度、信号等）不打印
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        backtest = Backtest(csv_dir, symbol_list, initial_capital, 0.0, start_date, data_handler, execution_handler,
+                            functools.partial(portfolio, record=record, results=results),
+                            functools.partial(strategy, **params))
+        backtest.simulate_trading()
+    metrics = backtest.portfolio.metrics
+    row = {'run': run}
+    row.update(params)
+    row.update([('total_return', metrics.total_return), ('sharpe_ratio', metrics.sharpe_ratio),
+                ('max_drawdown', metrics.max_drawdown), ('drawdown_duration', metrics.max_duration),
+                ('trades', metrics.trades), ('round_trips', metrics.round_trips),
+                ('signals', backtest.signals), ('orders', backtest.orders), ('fills', backtest.fills),
+                ('elapsed', time.time() - start)])
+    if results is not None:
+        row['run_dir'] = results.run_dir
+    return row
+
+
+class ParameterSweep(object):
+    """
+    参数扫描：按参数网格在进程池中并行运行Backtest，每组参数一次回测，统计结果汇总为一张DataFrame。
+    主进程先装载一次行情，清洗后的数据写入TickCache；各子进程的DataHandler命中缓存，以内存映射方式只读打开
+    同一组.npy文件，行情数组不经pickle传递，物理内存由操作系统在进程间共享
+    """
+
+    def __init__(self, csv_dir, symbol_list, initial_capital, start_date, data_handler, execution_handler, portfolio,
+                 strategy, workers=None, record='none', results_dir=None):
+        """
+        初始化
+        Parameters:
+        csv_dir, symbol_list, initial_capital, start_date - 见Backtest
+        data_handler - (Class) DataHandler，应以内存映射读取行情，如使用缓存的HistoricCSVDataHandler、TickStoreDataHandler
+        execution_handler - (Class) ExecutionHandler
+        portfolio - (Class) Portfolio
+        strategy - (Class) Strategy，每组参数以functools.partial(strategy, **params)传给Backtest
+        workers - 进程数，None为CPU核数，1为在主进程中依次运行
+        record - Portfolio的记录方式，默认'none'，统计结果来自Portfolio.metrics
+        results_dir - 不为None时，每次回测的结果写入其中的run-<序号>子文件夹，汇总表写入sweep子文件夹
+        """
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.initial_capital = initial_capital
+        self.start_date = start_date
+        self.data_handler_cls = data_handler
+        self.execution_handler_cls = execution_handler
+        self.portfolio_cls = portfolio
+        self.strategy_cls = strategy
+        self.workers = workers or os.cpu_count()
+        self.record = record
+        self.results_dir = results_dir
+
+    def _config(self):
+        return (self.csv_dir, self.symbol_list, self.initial_capital, self.start_date, self.data_handler_cls,
+                self.execution_handler_cls, self.portfolio_cls, self.strategy_cls, self.record, self.results_dir)
+
+    def run(self, grid):
+        """
+        运行参数网格中的全部回测
+        Parameters:
+        grid - 参数网格，见parameter_grid
+        Returns - DataFrame，每次回测一行，索引为序号，列为参数和统计结果
+        """
+
+        runs = parameter_grid(grid)
+        # 在主进程中清洗一次行情并写入缓存，子进程只需内存映射
+        start = time.time()
+        self.data_handler_cls(EventBus(), self.csv_dir, self.symbol_list)
+        print("Loaded tick data in %.1fs" % (time.time() - start))
+
+        config = self._config()
+        rows = []
+        if self.workers == 1:
+            for run, params in enumerate(runs):
+                rows.append(_run_backtest(config, run, params))
+                print("Runs: %d/%d" % (len(rows), len(runs)))
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(runs))) as pool:
+                futures = [pool.submit(_run_backtest, config, run, params) for run, params in enumerate(runs)]
+                for future in as_completed(futures):
+                    rows.append(future.result())
+                    print("Runs: %d/%d" % (len(rows), len(runs)))
+        print("Completed %d runs in %.1fs" % (len(runs), time.time() - start))
+
+        table = pd.DataFrame(rows).set_index('run').sort_index()
+        if self.results_dir is not None:
+            ResultsWriter(self.results_dir, run_name='sweep').write('runs', table)
+        return table
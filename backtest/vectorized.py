@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# vectorized.py
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+from event import EventBus, SignalType
+from performance import create_sharpe_ratio, create_drawdowns, create_performance_stats
+from portfolio import Portfolio
+
+
+class BarArrays(object):
+    """
+    按Backtest回放的顺序展开DataHandler的行情数组：第e行即第e条MarketEvent时各品种的最新一条行情。
+    与ArrayDataHandler.update_bars一致，最短的品种回放完时再推送一条MarketEvent后结束，
+    共min(行情条数) + 1行，已回放完的品种重复其最后一条行情
+    """
+
+    def __init__(self, bars):
+        """
+        Parameters:
+        bars - ArrayDataHandler对象，需要整段的列数组symbol_data
+        """
+
+        if not hasattr(bars, 'symbol_data'):
+            raise TypeError("Vectorized backtests need an ArrayDataHandler, got %s" % type(bars).__name__)
+        self.bars = bars
+        self.symbol_list = bars.symbol_list
+        lengths = np.array([len(bars.symbol_data[s]['index']) for s in self.symbol_list], dtype=np.int64)
+        # 第e条MarketEvent时品种i的游标为min(e + 1, lengths[i])，最新一条行情的行号为游标减1
+        self.rows = np.minimum(np.arange(lengths.min() + 1)[:, None], lengths[None, :] - 1)
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def values(self, symbol, val_type):
+        """
+        返回symbol的val_type列在每条MarketEvent时的最新值，一次花式索引，结果缓存
+        """
+
+        key = (symbol, val_type)
+        try:
+            return self.columns[key]
+        except KeyError:
+            pass
+        i = self.symbol_list.index(symbol)
+        values = self.bars.symbol_data[symbol][val_type][self.rows[:, i]]
+        values.flags.writeable = False
+        self.columns[key] = values
+        return values
+
+    def updated(self, symbol):
+        """
+        返回布尔数组，表示每条MarketEvent时symbol是否有新行情（已回放完时重复的行情为False）
+        """
+
+        rows = self.rows[:, self.symbol_list.index(symbol)]
+        return np.diff(rows, prepend=-1) != 0
+
+    def panel(self, val_type):
+        """
+        返回(行, 品种)的二维数组，按symbol_list排列
+        """
+
+        return np.column_stack([self.values(s, val_type) for s in self.symbol_list])
+
+    @property
+    def datetime(self):
+        """
+        每条MarketEvent的时间，取symbol_list[0]的最新行情时间，与Portfolio一致
+        """
+
+        return self.values(self.symbol_list[0], 'time')
+
+
+def signals_to_positions(signals):
+    """
+    按Portfolio.generate_naive_order的规则，由信号计算每条行情成交后的头寸方向（1、-1、0）：
+    空仓时LONG、SHORT开仓，EXIT平仓，其余信号被忽略。即每次平仓后第一个开仓信号决定方向，直到下一次平仓
+    Parameters:
+    signals - (行, 品种)数组，值为SignalType，NaN为无信号；每个品种每条行情至多一个信号
+    """
+
+    signals = np.asarray(signals, dtype=np.float64)
+    exits = signals == SignalType.EXIT
+    entries = (signals == SignalType.LONG) | (signals == SignalType.SHORT)
+    # 每次平仓开始一段，段内第一个开仓信号有效
+    segment = np.cumsum(exits, axis=0)
+    state = np.where(exits, 0.0, np.nan)
+    for j in range(signals.shape[1]):
+        idx = np.flatnonzero(entries[:, j])
+        if len(idx):
+            first = idx[np.unique(segment[idx, j], return_index=True)[1]]
+            state[first, j] = signals[first, j]
+    index = np.arange(len(state))[:, None]
+    last = np.maximum.accumulate(np.where(np.isnan(state), -1, index), axis=0)
+    filled = np.take_along_axis(state, np.maximum(last, 0), axis=0)
+    return np.where(last >= 0, filled, 0.0).astype(np.int64)
+
+
+class VectorizedResult(object):
+    """
+    一次向量化回测的结果，均为NumPy数组，格式与Portfolio的记录一致（record='tick'），按需转换为DataFrame
+    """
+
+    def __init__(self, symbol_list, datetime, positions, holdings, fills, signals):
+        """
+        Parameters:
+        symbol_list - 品种标签
+        datetime - 每条记录的时间，第一条为start_date
+        positions - (记录, 品种)头寸，每条行情的记录为该行情成交之前的头寸
+        holdings - (记录, 品种 + 3)市值，列为各品种、cash、commission、total
+        fills - 成交记录，{列名: 数组}，列与Portfolio写入结果的fills一致
+        signals - 信号个数
+        """
+
+        self.symbol_list = symbol_list
+        self.datetime = datetime
+        self.positions = positions
+        self.holdings = holdings
+        self.fills = fills
+        self.signals = signals
+        self.total = holdings[:, -1]
+
+    @property
+    def returns(self):
+        return self.total / np.append(np.nan, self.total[:-1]) - 1.0
+
+    def equity_curve(self):
+        """
+        权益曲线DataFrame，与Portfolio.create_equity_curve_dataframe一致
+        """
+
+        index = pd.Index(self.datetime, name='datetime')
+        curve = pd.DataFrame(self.holdings, index=index,
+                             columns=self.symbol_list + ['cash', 'commission', 'total'])
+        curve['returns'] = curve['total'].pct_change()
+        curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
+        return curve
+
+    def positions_frame(self):
+        return pd.DataFrame(self.positions, index=pd.Index(self.datetime, name='datetime'), columns=self.symbol_list)
+
+    def output_summary_stats(self):
+        """
+        统计总结，与Portfolio.output_summary_stats（record='tick'）一致
+        """
+
+        curve = self.equity_curve()
+        drawdown, max_dd, dd_duration = create_drawdowns(curve['equity_curve'])
+        sharpe_ratio = create_sharpe_ratio(curve['returns'], periods=Portfolio.PERIODS)
+        return [("Total Return", "%0.2f%%" % ((curve['equity_curve'].iloc[-1] - 1.0) * 100.0)),
+                ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
+                ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
+                ("Drawdown Duration", "%d" % dd_duration)]
+
+    def performance_stats(self, window=None):
+        """
+        数值形式的绩效指标，见create_performance_stats，参数筛选时用于排序
+        """
+
+        stats = create_performance_stats(self.returns, periods=Portfolio.PERIODS, window=window)
+        stats['signals'] = self.signals
+        stats['fills'] = len(self.fills['datetime'])
+        return stats
+
+
+class VectorizedBacktest(object):
+    """
+    向量化回测：对整段行情数组一次计算信号、头寸、成交（按当时的current价格）、手续费和权益曲线，
+    用于参数筛选。行情只装载一次，每组参数调用一次run。
+    成交规则与Backtest + Portfolio + SimulatedExecutionHandler一致：信号在当条行情成交，
+    每次成交quantity手、手续费commission；每条行情的记录为该行情成交之前的头寸按该行情价格计算的市值。
+    与事件驱动结果的一致性可用check_parity检查
+    """
+
+    def __init__(self, csv_dir, symbol_list, initial_capital, start_date, data_handler, strategy,
+                 quantity=10, commission=1.5):
+        """
+        初始化，装载行情
+        Parameters:
+        csv_dir - csv文件所在文件夹的路径
+        symbol_list - 品种标签列表，采用csv文件名
+        initial_capital - 初始资金
+        start_date - 开始时间
+        data_handler - (Class) ArrayDataHandler，数据接收
+        strategy - (Class) VectorizedStrategy，参数为BarArrays和策略参数
+        quantity - 每次开仓的手数，与Portfolio.generate_naive_order一致
+        commission - 每次成交的手续费，与SimulatedExecutionHandler一致
+        """
+        self.csv_dir = csv_dir
+        self.symbol_list = symbol_list
+        self.initial_capital = initial_capital
+        self.start_time = Portfolio._start_time(start_date)
+        self.strategy_cls = strategy
+        self.quantity = quantity
+        self.commission = commission
+        self.data_handler = data_handler(EventBus(), csv_dir, symbol_list)
+        self.data = BarArrays(self.data_handler)
+        self.prices = self.data.panel('current')
+
+    def run(self, **params):
+        """
+        以params为策略参数运行一次回测
+        Returns - VectorizedResult
+        """
+
+        signals = self.strategy_cls(self.data, **params).generate_signals()
+        positions = signals_to_positions(signals) * self.quantity
+        prices = self.prices
+        n_ticks, n = positions.shape
+
+        # 每条行情的成交，按当条行情价格成交
+        trades = np.diff(positions, axis=0, prepend=np.zeros((1, n), dtype=np.int64))
+        traded = trades != 0
+        fill_counts = traded.sum(axis=1)
+        cost = np.where(traded, trades * prices, 0.0).sum(axis=1)
+        cash = self.initial_capital - np.cumsum(cost + self.commission * fill_counts)
+        commission = self.commission * np.cumsum(fill_counts)
+
+        # 每条行情的记录在成交之前：上一条行情成交后的头寸、现金，按当条行情价格计算市值
+        held = np.vstack((np.zeros((1, n), dtype=np.int64), positions[:-1]))
+        holdings = np.empty((n_ticks + 1, n + 3))
+        holdings[0] = [0.0] * n + [self.initial_capital, 0.0, self.initial_capital]
+        np.multiply(held, prices, out=holdings[1:, :n])
+        holdings[1:, n] = np.append(self.initial_capital, cash[:-1])
+        holdings[1:, n + 1] = np.append(0.0, commission[:-1])
+        holdings[1:, n + 2] = holdings[1:, n] + holdings[1:, :n].sum(axis=1)
+
+        t, j = np.nonzero(traded)
+        times = self.data.panel('time')
+        fills = {'datetime': times[t, j].astype(np.int64),
+                 'symbol': np.array(self.symbol_list, dtype=str)[j],
+                 'direction': np.sign(trades[t, j]).astype(np.int8),
+                 'quantity': np.abs(trades[t, j]).astype(np.float64),
+                 'price': prices[t, j],
+                 'commission': np.full(len(t), self.commission)}
+        datetime = np.append(self.start_time, self.data.datetime).astype(np.int64)
+        return VectorizedResult(self.symbol_list, datetime, np.vstack((np.zeros((1, n), dtype=np.int64), held)),
+                                holdings, fills, int(np.count_nonzero(~np.isnan(signals))))
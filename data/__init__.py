@@ -1,2 +1,10 @@
-__all__ = ['DataHandler', 'HistoricCSVDataHandler']
-from .data import *
\ No newline at end of file
+__all__ = ['DataHandler', 'ArrayDataHandler', 'BufferedDataHandler', 'HistoricCSVDataHandler',
+           'TickStoreDataHandler', 'StreamingCSVDataHandler', 'BarDataHandler', 'BarAggregator', 'RingBuffer',
+           'TickCache', 'TickStore', 'parse_tick_time', 'format_tick_time', 'read_tick_csv', 'frame_to_columns', 'NANOS_PER_SECOND',
+           'NANOS_PER_DAY']
+from .data import *
+from .ringbuffer import *
+from .cache import *
+from .store import *
+from .streaming import *
+from .aggregate import *
\ No newline at end of file
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+# aggregate.py
+
+from __future__ import print_function
+
+import queue
+
+import numpy as np
+
+from event import MarketEvent
+from .data import BufferedDataHandler, HistoricCSVDataHandler, NANOS_PER_SECOND
+
+
+class BarAggregator(object):
+    """
+    将单个品种的tick增量合成为一根K线（OHLCV及VWAP），每条tick的开销为O(1)。
+    聚宽tick的high、low为当日最高、最低价，volume、money为当日累计值：
+    当日最高价在两条tick之间上升，说明期间在该价位有过成交，因此计入K线的high，low同理；
+    成交量、成交额取K线首尾累计值之差
+    """
+
+    # 合成K线的列，current与close相同，使按current取价的策略无需修改
+    FIELDS = ['open', 'high', 'low', 'close', 'current', 'volume', 'money', 'vwap', 'ticks']
+
+    def __init__(self, multiplier=1.0, cumulative=True):
+        """
+        初始化
+        Parameters:
+        multiplier - 合约乘数，money为成交额时VWAP = money / volume / multiplier
+        cumulative - volume、money是否为当日累计值，否则按每条tick的增量求和
+        """
+        self.multiplier = multiplier
+        self.cumulative = cumulative
+        # 上一根K线收盘时的累计成交量、成交额
+        self.base_volume = 0.0
+        self.base_money = 0.0
+        self.last_close = np.nan
+        # 上一条tick的当日最高、最低价
+        self.day_high = np.nan
+        self.day_low = np.nan
+        self._reset()
+
+    def _reset(self):
+        self.open = self.high = self.low = self.close = np.nan
+        self.volume = self.money = 0.0
+        self.ticks = 0
+
+    def update(self, current, high, low, volume, money):
+        """
+        读入一条tick，current为NaN（品种尚无数据）时忽略
+        """
+
+        if current != current:
+            return
+        if self.ticks == 0:
+            self.open = self.high = self.low = current
+        elif current > self.high:
+            self.high = current
+        elif current < self.low:
+            self.low = current
+        if high > self.day_high and high > self.high:
+            self.high = high
+        if low < self.day_low and low < self.low:
+            self.low = low
+        self.day_high = high
+        self.day_low = low
+        self.close = current
+        self.ticks += 1
+
+        if self.cumulative:
+            self.volume = volume
+            self.money = money
+        else:
+            self.volume += volume
+            self.money += money
+
+    def close_bar(self):
+        """
+        收盘当前K线并开始新的K线，返回按FIELDS排列的值。期间没有tick时返回以上一收盘价补齐、成交量为0的K线
+        """
+
+        if self.ticks == 0:
+            bar = [self.last_close] * 5 + [0.0, 0.0, self.last_close, 0]
+            self._reset()
+            return bar
+
+        if self.cumulative:
+            # 累计值变小说明跨日重新累计
+            if self.volume < self.base_volume:
+                self.base_volume = self.base_money = 0.0
+            volume = self.volume - self.base_volume
+            money = self.money - self.base_money
+            self.base_volume = self.volume
+            self.base_money = self.money
+        else:
+            volume = self.volume
+            money = self.money
+        vwap = money / volume / self.multiplier if volume > 0 else self.close
+
+        bar = [self.open, self.high, self.low, self.close, self.close, volume, money, vwap, self.ticks]
+        self.last_close = self.close
+        self._reset()
+        return bar
+
+
+class _DiscardEvents(object):
+    """
+    丢弃底层tick数据源产生的MarketEvent，只有K线收盘时才向回测事件队列推送
+    """
+
+    def put(self, event):
+        pass
+
+
+class BarDataHandler(BufferedDataHandler):
+    """
+    在tick数据源之上增量合成K线：按时间（interval秒）或按tick数（ticks条）聚合，
+    只有K线收盘时才推送MarketEvent，策略和Portfolio看到的是K线而不是tick。
+    get_latest_*接口不变，可取的列见BarAggregator.FIELDS。
+    通过functools.partial(BarDataHandler, interval=60)作为Backtest的data_handler，即可为策略选择分钟线。
+    K线周期对一次回测中的全部策略相同，不同策略需要不同周期时分别运行Backtest
+    """
+    def __init__(self, events, csv_dir, symbol_list, interval=60, ticks=None, source=HistoricCSVDataHandler,
+                 lookback=None, multiplier=1.0, cumulative=True):
+        """
+        初始化
+        Parameters:
+        events - 事件队列，即queue.Queue()
+        csv_dir - csv文件路径，传给source
+        symbol_list - 品种标签
+        interval - K线周期，秒。所有品种按同一时钟切分，以各品种最新tick时间的最大值为准
+        ticks - 不为None时按数据源每推进ticks次合成一根K线，忽略interval
+        source - (Class) tick数据源，以(events, csv_dir, symbol_list)构造
+        lookback - 每个品种至少保留的K线条数，默认由request_lookback决定
+        multiplier - 合约乘数，见BarAggregator
+        cumulative - volume、money是否为当日累计值，见BarAggregator
+        """
+        super(BarDataHandler, self).__init__(events, symbol_list, lookback)
+        self.source = source(_DiscardEvents(), csv_dir, symbol_list)
+        # 合成K线只需要数据源的最新一条tick
+        self.source.request_lookback(1)
+        self.interval = int(interval * NANOS_PER_SECOND)
+        self.ticks = ticks
+        self.aggregators = dict((s, BarAggregator(multiplier, cumulative)) for s in self.symbol_list)
+        # 当前K线的序号、时间桶和已读入的tick数
+        self.bar_count = 0
+        self.bucket = None
+        self.tick_count = 0
+        # 已读入BarAggregator的数据源行情条数
+        self.source_counts = dict((s, 0) for s in self.symbol_list)
+        for s in self.symbol_list:
+            self._initialize_buffers(s, BarAggregator.FIELDS)
+
+    def _feed_tick(self, symbols):
+        """
+        将数据源中symbols各自最新的一条tick读入其BarAggregator
+        """
+
+        source = self.source
+        get_value = source.get_latest_bar_value
+        for s in symbols:
+            self.source_counts[s] = source.get_bar_count(s)
+            self.aggregators[s].update(get_value(s, 'current'), get_value(s, 'high'), get_value(s, 'low'),
+                                       get_value(s, 'volume'), get_value(s, 'money'))
+
+    def _close_bars(self, time):
+        """
+        所有品种的当前K线收盘，存入环形缓冲区
+        """
+
+        for s in self.symbol_list:
+            self._append_bar(s, self.bar_count, time, self.aggregators[s].close_bar())
+        self.bar_count += 1
+
+    def update_bars(self):
+        """
+        从数据源读取tick直到有K线收盘，然后推送MarketEvent，每根K线恰好一条。
+        数据源结束时，未满周期的最后一根K线也会收盘；此时没有未收盘的tick则不推送。
+        各品种长度不同时，数据源在最短的品种耗尽的这一步停止，其他品种在这一步仍有新tick，同样读入
+        """
+
+        source = self.source
+        closed = False
+        while not closed:
+            if not source.continue_backtest:
+                # 数据源已耗尽。上一次调用收盘后数据源恰好耗尽时，最后一根K线在这一次调用收盘，保证每条MarketEvent对应一根K线
+                if self.tick_count > 0:
+                    self._close_bars(self.last_time)
+                    self.tick_count = 0
+                    closed = True
+                self.continue_backtest = False
+                break
+
+            source.update_bars()
+            # 只读入这一步有新tick的品种
+            updated = [s for s in self.symbol_list if source.get_bar_count(s) != self.source_counts[s]]
+            if not updated:
+                continue
+            time = max(source.get_latest_bar_datetime(s) for s in self.symbol_list)
+            if self.ticks is None:
+                bucket = time // self.interval
+                closed = self.bucket is not None and bucket != self.bucket
+                if closed:
+                    self._close_bars(self.last_time)
+                    self.tick_count = 0
+                self.bucket = bucket
+            self._feed_tick(updated)
+            self.tick_count += 1
+            self.last_time = time
+            if self.ticks is not None and self.tick_count >= self.ticks:
+                self._close_bars(time)
+                self.tick_count = 0
+                closed = True
+        if closed:
+            self.events.put(MarketEvent())
+
+
+if __name__ == '__main__':
+    data_handler = BarDataHandler(events=queue.Queue(), csv_dir='D:\\tick_data\\test_data',
+                                  symbol_list=['A2001_2019-11-05'], interval=60)
+    i = 0
+    while i < 10:
+        data_handler.update_bars()
+        i += 1
+    print(data_handler.get_latest_bar('A2001_2019-11-05'))
+    print(data_handler.get_latest_bars_values('A2001_2019-11-05', 'vwap', 5))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+# cache.py
+
+from __future__ import print_function
+
+import hashlib
+import json
+import os, os.path
+import re
+import shutil
+
+import numpy as np
+
+
+class TickCache(object):
+    """
+    清洗后tick数据的二进制缓存。每个品种的每一列保存为一个.npy文件，读取时以内存映射方式打开，不再重复解析csv。
+    缓存键由源文件的绝对路径、修改时间、大小和清洗参数共同决定，源文件变化后自动失效
+    """
+
+    # 缓存格式或清洗逻辑变化时递增，使旧缓存全部失效
+    VERSION = 2
+
+    def __init__(self, cache_dir):
+        """
+        初始化
+        Parameters:
+        cache_dir - 缓存文件夹路径，不存在时在写入时创建
+        """
+        self.cache_dir = cache_dir
+
+    def make_key(self, paths, options=None):
+        """
+        根据源文件状态和清洗参数计算缓存键
+        Parameters:
+        paths - 源csv文件路径列表
+        options - 清洗参数，可JSON序列化的字典
+        """
+
+        sources = []
+        for path in paths:
+            st = os.stat(path)
+            sources.append([os.path.abspath(path), st.st_mtime_ns, st.st_size])
+        payload = json.dumps([self.VERSION, sources, options or {}], sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+    def _entry_dir(self, name, key):
+        return os.path.join(self.cache_dir, '%s-%s' % (name, key))
+
+    def load(self, name, key):
+        """
+        读取缓存，返回{symbol: {列名: 只读数组}}，数组以内存映射方式打开；缓存不存在时返回None。
+        缓存损坏（如某列的.npy文件缺失或被截断）时删除该缓存并返回None，由调用方重新清洗csv
+        """
+
+        entry = self._entry_dir(name, key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if meta.get('key') != key:
+            return None
+
+        data = {}
+        try:
+            for symbol, columns in meta['symbols'].items():
+                data[symbol] = {}
+                for i, col in enumerate(columns):
+                    arr = np.load(os.path.join(entry, symbol, '%d.npy' % i), mmap_mode='r')
+                    # 去掉memmap子类，切片时没有额外开销；底层内存仍为映射文件
+                    data[symbol][col] = np.asarray(arr)
+        except (IOError, OSError, EOFError, ValueError, KeyError):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        return data
+
+    def store(self, name, key, data):
+        """
+        写入缓存，并删除同名的过期缓存。写入失败（如目录只读、列为object类型）时返回False，不影响回测
+        Parameters:
+        name - 缓存名称，一般为品种标签
+        key - make_key()计算的缓存键
+        data - {symbol: {列名: 数组}}
+        """
+
+        entry = self._entry_dir(name, key)
+        tmp = '%s.tmp-%d' % (entry, os.getpid())
+        try:
+            meta = {'key': key, 'symbols': {}}
+            for symbol, columns in data.items():
+                os.makedirs(os.path.join(tmp, symbol))
+                meta['symbols'][symbol] = list(columns)
+                # 列名可能不是合法文件名，按序号保存
+                for i, arr in enumerate(columns.values()):
+                    np.save(os.path.join(tmp, symbol, '%d.npy' % i), np.asarray(arr), allow_pickle=False)
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            self._remove_stale(name, key)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # 其他进程已写入同一缓存键，内容相同，保留已有的缓存
+                if not os.path.isdir(entry):
+                    raise
+                shutil.rmtree(tmp, ignore_errors=True)
+        except (IOError, OSError, ValueError):
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    def _remove_stale(self, name, key):
+        """
+        删除同名但缓存键不同的旧缓存，保留key对应的缓存（可能由其他进程刚刚写入）
+        """
+
+        pattern = re.compile(r'^%s-[0-9a-f]{16}$' % re.escape(name))
+        current = os.path.basename(self._entry_dir(name, key))
+        for d in os.listdir(self.cache_dir):
+            if pattern.match(d) and d != current:
+                shutil.rmtree(os.path.join(self.cache_dir, d), ignore_errors=True)
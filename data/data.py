@@ -1,15 +1,135 @@
 from __future__ import print_function
 
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 import datetime
 import os, os.path
 import queue
-import re
 
 import numpy as np
 import pandas as pd
 
 from event import MarketEvent
+from .cache import TickCache
+from .ringbuffer import RingBuffer
+
+
+# 1秒对应的纳秒数，tick时间统一以int64纳秒表示
+NANOS_PER_SECOND = 10 ** 9
+
+# 1天对应的纳秒数
+NANOS_PER_DAY = 24 * 60 * 60 * NANOS_PER_SECOND
+
+# 没有任何Strategy、Portfolio声明回看条数时，环形缓冲区保留的行情条数
+DEFAULT_LOOKBACK = 5000
+
+
+def parse_tick_time(times):
+    """
+    将聚宽tick数据的time列向量化解析为int64纳秒，保留毫秒。
+    带日期的时间（如‘2019-11-05 09:00:01.500’）解析为epoch纳秒，仅有时分秒的时间（如‘09:00:01’）解析为当日纳秒数
+    Parameters:
+    times - time列，pandas Series或数组
+    Returns - int64 NumPy数组
+    """
+
+    times = pd.Series(times)
+    if times.dtype.kind == 'M':
+        return np.asarray(times, dtype='datetime64[ns]').view(np.int64)
+    times = times.astype(str)
+    if len(times) and ' ' not in times.iloc[0] and '-' not in times.iloc[0]:
+        return np.asarray(pd.to_timedelta(times), dtype='timedelta64[ns]').view(np.int64)
+    try:
+        parsed = pd.to_datetime(times, format='ISO8601')
+    except (TypeError, ValueError):
+        parsed = pd.to_datetime(times)
+    return np.asarray(parsed, dtype='datetime64[ns]').view(np.int64)
+
+
+def format_tick_time(time):
+    """
+    将parse_tick_time得到的int64纳秒转换为可读的时间字符串，用于输出。
+    不足一天的值为当日纳秒数，输出'09:00:01.500'，其余输出'2019-11-05 09:00:01.500'
+    """
+
+    time = int(time)
+    if 0 <= time < NANOS_PER_DAY:
+        seconds, nanos = divmod(time, NANOS_PER_SECOND)
+        return '%02d:%02d:%02d.%03d' % (seconds // 3600, seconds // 60 % 60, seconds % 60, nanos // 10 ** 6)
+    return pd.Timestamp(time).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def _tick_day(time):
+    """
+    返回tick时间当日零点的纳秒时间；仅有时分秒的时间（不足一天）返回0
+    """
+
+    time = int(time)
+    return time // NANOS_PER_DAY * NANOS_PER_DAY if time >= NANOS_PER_DAY else 0
+
+
+def read_tick_csv(path):
+    """
+    读取并清洗单个聚宽tick数据csv文件，time列解析为int64纳秒
+    Parameters:
+    path - csv文件路径
+    Returns - DataFrame
+    """
+
+    # 读取聚宽tick数据，列名为['time', 'current', 'high', 'low', 'volume', 'money', 'position', 'a1_v',
+    #                          'a1_p', 'b1_v', 'b1_p']
+    symbol_data = pd.read_csv(path, header=0, index_col=0)
+    symbol_data['time'] = parse_tick_time(symbol_data['time'])
+    # 对于期货日内tick数据，不需要补齐日期索引
+    return symbol_data
+
+
+def frame_to_columns(frame):
+    """
+    将清洗好的DataFrame一次性转换为只读的连续NumPy列数组{列名: 数组}，原索引存为'index'列
+    """
+
+    columns = {'index': np.ascontiguousarray(frame.index.to_numpy())}
+    for col in frame.columns:
+        columns[col] = np.ascontiguousarray(frame[col].to_numpy())
+    for arr in columns.values():
+        arr.flags.writeable = False
+    return columns
+
+
+def _stack_window(columns):
+    """
+    将columns[i][j]（第i个品种第j个字段的最新若干条数据）按尾部对齐，堆叠为(n, k, m)数组，n为最短的长度
+    """
+
+    n = min(len(c) for cols in columns for c in cols) if columns and columns[0] else 0
+    window = np.empty((n, len(columns), len(columns[0]) if columns else 0),
+                      dtype=np.result_type(*[c for cols in columns for c in cols]) if n else np.float64)
+    for i, cols in enumerate(columns):
+        for j, c in enumerate(cols):
+            window[:, i, j] = c[len(c) - n:]
+    return window
+
+
+def _check_lookback(N):
+    """
+    回看条数必须为正整数。原来的bars_list[-N:]在N=0时返回全部历史，现在明确拒绝
+    """
+
+    if N < 1:
+        raise ValueError("N must be a positive number of bars, got %r" % (N,))
+
+
+def _load_csv_to_cache(path, cache_dir, name, key):
+    """
+    进程池中执行：读取并清洗一个csv文件，写入二进制缓存。写入成功返回None，由主进程内存映射读取；
+    未使用缓存或写入失败时返回列数组
+    """
+
+    columns = frame_to_columns(read_tick_csv(path))
+    if cache_dir is not None and TickCache(cache_dir).store(name, key, {name: columns}):
+        return None
+    return columns
 
 
 class DataHandler(object):
@@ -35,7 +155,7 @@ class DataHandler(object):
     @abstractmethod
     def get_latest_bar_datetime(self, symbol):
         """
-        返回最后一条行情的时间，datetime对象
+        返回最后一条行情的时间，int64纳秒（见parse_tick_time）
         """
         raise NotImplementedError("Should implement get_latest_bar_datetime()")
 
@@ -53,6 +173,27 @@ class DataHandler(object):
         """
         raise NotImplementedError("Should implement get_latest_bars_values()")
 
+    def get_latest_values(self, val_type):
+        """
+        返回所有品种最后一条行情的val_type值，为按symbol_list排列的NumPy数组。
+        子类可以覆盖为向量化实现，这里逐个品种调用get_latest_bar_value
+        """
+        return np.array([self.get_latest_bar_value(s, val_type) for s in self.symbol_list])
+
+    def get_latest_window(self, symbols, val_types, N=1):
+        """
+        返回多个品种、多个字段最新N条行情组成的(N, k, m)三维数组，第i个品种第j个字段为[:, i, j]。
+        各品种可取的行情少于N条时，按最少的品种截取，保证各品种的最后一行都是其最新行情。
+        这里逐个品种、逐个字段调用get_latest_bars_values并复制，子类可以覆盖为视图
+        Parameters:
+        symbols - 品种标签列表，k个
+        val_types - 字段列表，m个
+        N - 行情条数
+        """
+        _check_lookback(N)
+        columns = [[np.asarray(self.get_latest_bars_values(s, v, N)) for v in val_types] for s in symbols]
+        return _stack_window(columns)
+
     @abstractmethod
     def update_bars(self):
         """
@@ -60,200 +201,545 @@ class DataHandler(object):
         """
         raise NotImplementedError("Should implement update_bars()")
 
+    @abstractmethod
+    def get_bar_count(self, symbol):
+        """
+        返回品种已获取到的行情条数。回放结束时最后一条MarketEvent不带新行情，条数不变，
+        据此可以判断自上次读取以来有没有新行情
+        """
+        raise NotImplementedError("Should implement get_bar_count()")
+
+    def request_lookback(self, N):
+        """
+        声明需要回看的最大行情条数，由Strategy和Portfolio在初始化时调用。
+        数据整体在内存（或内存映射）中的DataHandler无需处理；以缓冲区保存行情的子类只保留各方声明的最大值
+        """
+        pass
 
-class HistoricCSVDataHandler(DataHandler):
+
+class ArrayDataHandler(DataHandler):
     """
-    读取并处理csv文件，模拟实盘情况，获取最新一条行情数据
+    回放内存（或内存映射）中列数组的DataHandler基类。每个品种的数据为{列名: NumPy数组}，
+    update_bars只移动游标，get_latest_*返回游标之前的数据，不做拷贝。子类负责装载symbol_data
     """
-    def __init__(self, events, csv_dir, symbol_list):
+    def __init__(self, events, symbol_list):
         """
         初始化
         Parameters:
         events - 事件队列，即queue.Queue()
-        csv_dir - csv文件路径
-        symbol_list - 品种标签，采用csv文件名
+        symbol_list - 品种标签
         """
         self.events = events
-        self.csv_dir = csv_dir
         self.symbol_list = symbol_list
-        # 存储清洗好的数据
+        # 存储清洗好的数据，每个品种为{列名: 连续的NumPy数组}
         self.symbol_data = {}
-        # 存储获取到的行情数据，模拟实盘的数据实时获取
-        self.latest_symbol_data = {}
+        # 品种在symbol_list中的序号
+        self.symbol_index = dict((s, i) for i, s in enumerate(self.symbol_list))
+        # 每个品种已推送的行情条数，即回放游标，按symbol_list排列。
+        # symbol_data[s][col][:cursor]就是已获取到的行情，模拟实盘的数据实时获取
+        self.cursors = np.zeros(len(self.symbol_list), dtype=np.int64)
+        # 每个品种的行情条数，第一次update_bars时确定
+        self.lengths = None
+        # get_latest_values用的拼接列，见_flat_column
+        self.flat_columns = {}
+        # get_latest_window用的(行, 品种, 字段)三维数组，见_panel
+        self.panels = {}
         self.continue_backtest = True
 
-        # 配对策略，传入2个csv文件时的数据预处理
-        if len(self.symbol_list) == 2:
-            self._open_convert_csv_files_in_pairs()
-        # 非配对策略，传入一个、三个或多个csv文件时的数据预处理
-        else:
-            self._open_convert_csv_files()
+    def _bar(self, symbol, i):
+        """
+        返回第i条行情，格式与iterrows()一致，为(index, BarView)
+        """
 
-        self.symbol_iters = self._initialize_iters()
+        columns = self.symbol_data[symbol]
+        return columns['index'][i], BarView(columns, i)
 
-    def _open_convert_csv_files(self):
+    def _latest_row(self, symbol):
         """
-        打开若干csv文件，将数据存入字典。数据源自聚宽的get_ticks
+        返回品种最新一条行情的行号。尚未获取到行情（游标为0）时抛出IndexError，不会回绕读到最后一行
         """
 
-        # comb_index = None
-        for s in self.symbol_list:
-            # Load the CSV file with no header information, indexed on date
-            # self.symbol_data[s] = pd.read_csv(os.path.join(self.csv_dir, '%s.csv' % s), header=0, index_col=0,
-            #                                   parse_dates=True, names=['datetime', 'open', 'high','low', 'close',
-            #                                                            'volume', 'adj_close']).sort_index()
-
-            # 读取聚宽tick数据，列名为['time', 'current', 'high', 'low', 'volume', 'money', 'position', 'a1_v',
-            #                          'a1_p', 'b1_v', 'b1_p']
-            self.symbol_data[s] = pd.read_csv(os.path.join(self.csv_dir, '%s.csv' % s), header=0, index_col=0)# >>>>
-            self.symbol_data[s]['time'] = self.symbol_data[s]['time'].astype('str')
-            self.symbol_data[s]['time'] = self.symbol_data[s]['time'].apply(lambda t: re.findall(
-                r'[0-9]*:[0-9]*:[0-9][0-9]', t)[0])
-
-            # Combine the index to pad forward values，但是对于期货日内tick数据，不需要补齐日期索引
-            # if comb_index is None:
-            #     comb_index = self.symbol_data[s].index
-            # else:
-            #     comb_index.union(self.symbol_data[s].index)
-            # Set the latest symbol_data to None
-            self.latest_symbol_data[s] = []
-        # Reindex the dataframes，但是对于期货日内tick数据，不需要补齐日期索引
-        # for s in self.symbol_list:
-        #     self.symbol_data[s] = self.symbol_data[s].reindex(index=comb_index, method='pad').iterrows()
+        try:
+            cursor = self.cursors[self.symbol_index[symbol]]
+        except KeyError:
+            print("That symbol is not available in the historical data set.")
+            raise
+        if cursor == 0:
+            raise IndexError("No bars have been received for %s yet" % symbol)
+        return cursor - 1
 
-    def _open_convert_csv_files_in_pairs(self):
+    def get_latest_bar(self, symbol):
         """
-        打开一对csv文件，将数据存入字典。数据源自聚宽的get_ticks
+        返回最新获取到的行情数据
         """
 
-        # 分别打开两个文件，提取时间，格式为‘09：01：01’，丢弃秒级重复数据，保留第一条
-        symbol_data_x = pd.read_csv(os.path.join(self.csv_dir, '%s.csv' % self.symbol_list[0]), header=0,
-                                    index_col=0)
-        symbol_data_x['time'] = symbol_data_x['time'].astype(str).apply(lambda t: re.findall(
-            r'[0-9]*:[0-9]*:[0-9][0-9]', t)[0])
-        symbol_data_x.drop_duplicates(subset='time', keep='first', inplace=True)
+        return self._bar(symbol, self._latest_row(symbol))
 
-        symbol_data_y = pd.read_csv(os.path.join(self.csv_dir, '%s.csv' % self.symbol_list[1]), header=0,
-                                    index_col=0)
-        symbol_data_y['time'] = symbol_data_y['time'].astype(str).apply(lambda t: re.findall(
-            r'[0-9]*:[0-9]*:[0-9][0-9]', t)[0])
-        symbol_data_y.drop_duplicates(subset='time', keep='first', inplace=True)
+    def get_latest_bars(self, symbol, N=1):
+        """
+        返回最新获取到的N条行情数据
+        """
 
-        # 将两个数据进行拼接，并以time列进行数据对其，对于缺失数据，以前一秒来补齐，然后存入字典
-        symbol_data_xy = symbol_data_x.merge(symbol_data_y, how='outer', on='time')
-        symbol_data_xy.sort_values(by='time', inplace=True, ascending=True)
-        symbol_data_xy.reset_index(drop=True, inplace=True)
-        symbol_data_xy.fillna(method='ffill', inplace=True)
-        self.symbol_data[self.symbol_list[0]] = symbol_data_xy[['time', 'current_x', 'high_x', 'low_x', 'volume_x',
-                                                               'money_x', 'position_x', 'a1_v_x', 'a1_p_x',
-                                                               'b1_v_x', 'b1_p_x']]
-        self.symbol_data[self.symbol_list[1]] = symbol_data_xy[['time', 'current_y', 'high_y', 'low_y', 'volume_y',
-                                                               'money_y', 'position_y', 'a1_v_y', 'a1_p_y',
-                                                               'b1_v_y', 'b1_p_y']]
+        _check_lookback(N)
+        try:
+            cursor = self.cursors[self.symbol_index[symbol]]
+        except KeyError:
+            print("That symbol is not available in the historical data set.")
+            raise
+        else:
+            return [self._bar(symbol, i) for i in range(max(cursor - N, 0), cursor)]
 
-        # 在merge后，对列统一重命名
-        for s in self.symbol_list:
-            self.symbol_data[s].columns = ['time', 'current', 'high', 'low', 'volume', 'money', 'position', 'a1_v',
-                                           'a1_p', 'b1_v', 'b1_p']
-            self.latest_symbol_data[s] = []
+    def get_latest_bar_datetime(self, symbol):
+        """
+        返回最新获取到的行情数据的time值，int64纳秒
+        """
+
+        return self.symbol_data[symbol]['time'][self._latest_row(symbol)]
 
-    def _get_new_bar(self, symbol):
+    def get_latest_bar_value(self, symbol, val_type):
         """
-        从清洗好的数据字典中，获取最新一条行情数据。模仿实盘的数据接收
+        根据val_type，返回最新获取到的行情数据的value
         """
 
-        for b in self.symbol_data[symbol].iterrows():
-            yield b
+        return self.symbol_data[symbol][val_type][self._latest_row(symbol)]
 
-    def get_latest_bar(self, symbol):
+    def get_latest_bars_values(self, symbol, val_type, N=1):
         """
-        返回最新获取到的行情数据
+        根据val_type，返回最新获取到的N条行情数据的value。返回列数组的只读视图，不做拷贝
         """
 
+        _check_lookback(N)
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            cursor = self.cursors[self.symbol_index[symbol]]
         except KeyError:
             print("That symbol is not available in the historical data set.")
             raise
         else:
-            return bars_list[-1]
+            return self.symbol_data[symbol][val_type][max(cursor - N, 0):cursor]
 
-    def get_latest_bars(self, symbol, N=1):
+    def get_bar_count(self, symbol):
         """
-        返回最新获取到的N条行情数据
+        返回品种已获取到的行情条数，即回放游标
+        """
+
+        return int(self.cursors[self.symbol_index[symbol]])
+
+    def _flat_column(self, val_type):
+        """
+        将所有品种的val_type列拼接为一个数组（首次调用时复制一次），每个品种之前有一个空位（NaN，整数列为0），
+        品种i最新一条数据的位置即offsets[i] + cursors[i]，游标为0（尚无行情）时落在空位上
         """
 
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            return self.flat_columns[val_type]
         except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-N:]
+            pass
+        columns = [self.symbol_data[s][val_type] for s in self.symbol_list]
+        dtype = np.result_type(*columns)
+        empty = np.array([np.nan if dtype.kind in 'fc' else 0], dtype=dtype)
+        flat = np.concatenate([part for col in columns for part in (empty, col)])
+        offsets = np.cumsum([0] + [len(col) + 1 for col in columns[:-1]])
+        self.flat_columns[val_type] = (flat, offsets)
+        return flat, offsets
 
-    def get_latest_bar_datetime(self, symbol):
+    def get_latest_values(self, val_type):
+        """
+        返回所有品种最后一条行情的val_type值，按symbol_list排列，一次向量化取值
+        """
+
+        flat, offsets = self._flat_column(val_type)
+        return flat[offsets + self.cursors]
+
+    def _panel(self, symbols, val_types):
         """
-        返回最新获取到的行情数据的time值
+        将各品种的val_types列按行号合并为一个只读的(行, 品种, 字段)三维数组，首次调用时复制一次，
+        行数为各品种中最短的长度
         """
 
+        key = (tuple(symbols), tuple(val_types))
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            return self.panels[key]
         except KeyError:
-            print("That symbol is not available in the historical data set.")
-            raise
-        else:
-            return bars_list[-1][1]['time']
+            pass
+        columns = [[self.symbol_data[s][v] for v in val_types] for s in symbols]
+        n = min(len(c) for cols in columns for c in cols)
+        panel = _stack_window([[c[:n] for c in cols] for cols in columns])
+        panel.flags.writeable = False
+        self.panels[key] = panel
+        return panel
 
-    def get_latest_bar_value(self, symbol, val_type):
+    def get_latest_window(self, symbols, val_types, N=1):
         """
-        根据val_type，返回最新获取到的行情数据的value
+        返回(N, k, m)的最新行情窗口，见DataHandler.get_latest_window。
+        各品种游标相同时（如配对数据按时间对齐后），返回_panel的只读视图，不做拷贝；否则逐个品种复制
         """
 
+        _check_lookback(N)
         try:
-            bars_list = self.latest_symbol_data[symbol]
+            cursors = [self.cursors[self.symbol_index[s]] for s in symbols]
         except KeyError:
             print("That symbol is not available in the historical data set.")
             raise
-        else:
-            return getattr(bars_list[-1][1], val_type)
+        cursor = cursors[0]
+        if any(c != cursor for c in cursors):
+            return super(ArrayDataHandler, self).get_latest_window(symbols, val_types, N)
+        return self._panel(symbols, val_types)[max(cursor - N, 0):cursor]
 
-    def get_latest_bars_values(self, symbol, val_type, N=1):
+    def update_bars(self):
         """
-        根据val_type，返回最新获取到的N条行情数据的value
+        模拟实盘数据接收，每个品种的游标前进1条，新数据即可通过get_latest_*获取
         """
 
+        if self.lengths is None:
+            self.lengths = np.array([len(self.symbol_data[s]['index']) for s in self.symbol_list], dtype=np.int64)
+        advance = self.cursors < self.lengths
+        if not advance.all():
+            self.continue_backtest = False
+        self.cursors += advance
+        self.events.put(MarketEvent())
+
+
+class BufferedDataHandler(DataHandler):
+    """
+    以环形缓冲区保存最近lookback条行情的DataHandler基类，用于数据流式到达、不能整体装入内存的场景。
+    每个品种的数值列存为一个二维(lookback, 列数)的float64环形缓冲区，另有index和time两个缓冲区。
+    get_latest_*返回的数组和BarView不拷贝数据，只在下一次update_bars之前有效，需要保存时先copy()。
+    子类在update_bars中调用_append_bar写入新数据
+    """
+    def __init__(self, events, symbol_list, lookback=None):
+        """
+        初始化
+        Parameters:
+        events - 事件队列，即queue.Queue()
+        symbol_list - 品种标签
+        lookback - 每个品种至少保留的行情条数。为None时由request_lookback声明的最大值决定，
+                   没有任何声明时为DEFAULT_LOOKBACK
+        """
+        self.events = events
+        self.symbol_list = symbol_list
+        self.requested_lookback = lookback
+        # 环形缓冲区当前的容量
+        self.lookback = lookback or DEFAULT_LOOKBACK
+        # 每个品种的数值列名及其在数值行中的位置
+        self.symbol_columns = {}
+        # 存储获取到的行情数据，每个品种为{'index', 'time', 'values'}三个环形缓冲区
+        self.latest_symbol_data = {}
+        # 每个品种已写入的行情条数，不受缓冲区容量限制
+        self.symbol_bar_counts = dict((s, 0) for s in self.symbol_list)
+        self.continue_backtest = True
+
+    def _initialize_buffers(self, symbol, columns, index_dtype=np.int64):
+        """
+        为品种建立环形缓冲区
+        Parameters:
+        symbol - 品种标签
+        columns - 数值列名列表，决定数值行中各列的位置
+        index_dtype - index列的类型
+        """
+
+        self.symbol_columns[symbol] = dict((c, j) for j, c in enumerate(columns))
+        self.latest_symbol_data[symbol] = {
+            'index': RingBuffer(self.lookback, index_dtype),
+            'time': RingBuffer(self.lookback, np.int64),
+            'values': RingBuffer(self.lookback, np.float64, shape=(len(columns),)),
+        }
+
+    def request_lookback(self, N):
+        """
+        声明需要回看的最大行情条数，缓冲区容量调整为各方声明的最大值，更早的数据被回收
+        """
+
+        self.requested_lookback = max(N, self.requested_lookback or 0)
+        if self.requested_lookback != self.lookback:
+            self.lookback = self.requested_lookback
+            for buffers in self.latest_symbol_data.values():
+                for buf in buffers.values():
+                    buf.resize(self.lookback)
+
+    def _append_bar(self, symbol, index, time, values):
+        """
+        写入品种的一条新行情，values按_initialize_buffers的columns排列
+        """
+
+        buffers = self.latest_symbol_data[symbol]
+        buffers['index'].append(index)
+        buffers['time'].append(time)
+        buffers['values'].append(values)
+        self.symbol_bar_counts[symbol] += 1
+
+    def get_bar_count(self, symbol):
+        """
+        返回品种已获取到的行情条数
+        """
+
+        return self.symbol_bar_counts[symbol]
+
+    def _latest_column(self, symbol, val_type, N):
+        """
+        返回品种某列最新N条数据的只读视图
+        """
+
+        _check_lookback(N)
         try:
-            bars_list = self.get_latest_bars(symbol, N)
+            buffers = self.latest_symbol_data[symbol]
         except KeyError:
             print("That symbol is not available in the historical data set.")
             raise
-        else:
-            return np.array([getattr(b[1], val_type) for b in bars_list])
+        if val_type in ('index', 'time'):
+            return buffers[val_type].latest(N)
+        return buffers['values'].latest(N)[:, self.symbol_columns[symbol][val_type]]
 
-    def update_bars(self):
+    def _latest_bar_views(self, symbol, N):
         """
-        模拟实盘数据接收，从存储的数据字典中获取1条新数据，并存入latest_symbol_data以备回测使用
+        以(index, BarView)的形式返回最新N条行情
         """
 
-        for s in self.symbol_list:
+        columns = dict((c, self._latest_column(symbol, c, N)) for c in self.symbol_columns[symbol])
+        columns['time'] = self._latest_column(symbol, 'time', N)
+        index = self._latest_column(symbol, 'index', N)
+        return [(index[i], BarView(columns, i)) for i in range(len(index))]
+
+    def get_latest_bar(self, symbol):
+        """
+        返回最新获取到的行情数据
+        """
+
+        return self._latest_bar_views(symbol, 1)[-1]
+
+    def get_latest_bars(self, symbol, N=1):
+        """
+        返回最新获取到的N条行情数据
+        """
+
+        return self._latest_bar_views(symbol, N)
+
+    def get_latest_bar_datetime(self, symbol):
+        """
+        返回最新获取到的行情数据的time值，int64纳秒
+        """
+
+        return self._latest_column(symbol, 'time', 1)[-1]
+
+    def get_latest_bar_value(self, symbol, val_type):
+        """
+        根据val_type，返回最新获取到的行情数据的value
+        """
+
+        return self._latest_column(symbol, val_type, 1)[-1]
+
+    def get_latest_bars_values(self, symbol, val_type, N=1):
+        """
+        根据val_type，返回最新获取到的N条行情数据的value，为环形缓冲区的只读视图，后续行情写入时可能被覆盖
+        """
+
+        return self._latest_column(symbol, val_type, N)
+
+    def get_latest_window(self, symbols, val_types, N=1):
+        """
+        返回(N, k, m)的最新行情窗口，见DataHandler.get_latest_window。
+        每个品种从数值缓冲区一次取出所需的列，而不是逐个字段读取
+        """
+
+        _check_lookback(N)
+        columns = []
+        for s in symbols:
             try:
-                bar = next(self.symbol_iters[s])
-            except StopIteration:
-                self.continue_backtest = False
-            else:
-                if bar is not None:
-                    self.latest_symbol_data[s].append(bar)
-        self.events.put(MarketEvent())
+                buffers = self.latest_symbol_data[s]
+            except KeyError:
+                print("That symbol is not available in the historical data set.")
+                raise
+            values = buffers['values'].latest(N)
+            columns.append([buffers[v].latest(N) if v in ('index', 'time') else values[:, self.symbol_columns[s][v]]
+                            for v in val_types])
+        return _stack_window(columns)
+
 
-    def _initialize_iters(self):
+class HistoricCSVDataHandler(ArrayDataHandler):
+    """
+    读取并处理csv文件，模拟实盘情况，获取最新一条行情数据
+    """
+    def __init__(self, events, csv_dir, symbol_list, use_cache=True, cache_dir=None, workers=1):
         """
-        根据品种列表，为每个csv初始化一个迭代器，装入字典
+        初始化
+        Parameters:
+        events - 事件队列，即queue.Queue()
+        csv_dir - csv文件路径
+        symbol_list - 品种标签，采用csv文件名
+        use_cache - 是否使用清洗后数据的二进制缓存，见TickCache
+        cache_dir - 缓存文件夹，默认为csv_dir下的.tick_cache
+        workers - 非配对模式下并行读取清洗csv的进程数，None为CPU核数
+        """
+        super(HistoricCSVDataHandler, self).__init__(events, symbol_list)
+        self.csv_dir = csv_dir
+        self.workers = workers or os.cpu_count()
+        if use_cache:
+            self.cache = TickCache(cache_dir or os.path.join(self.csv_dir, '.tick_cache'))
+        else:
+            self.cache = None
+
+        # 配对策略，传入2个csv文件时的数据预处理
+        if len(self.symbol_list) == 2:
+            self._open_convert_csv_files_in_pairs()
+        # 非配对策略，传入一个、三个或多个csv文件时的数据预处理
+        else:
+            self._open_convert_csv_files()
+
+    def _csv_path(self, symbol):
+        return os.path.join(self.csv_dir, '%s.csv' % symbol)
+
+    def _load_with_cache(self, symbols, mode, clean):
+        """
+        读取symbols对应的清洗后数据。缓存命中时直接内存映射，否则调用clean(*symbols)清洗csv并写入缓存
+        Parameters:
+        symbols - 一起清洗的品种标签
+        mode - 清洗方式，'single'或'pairs'，作为缓存键的一部分
+        clean - 清洗函数，返回{symbol: DataFrame}
+        """
+
+        name = '+'.join(symbols)
+        if self.cache is not None:
+            key = self.cache.make_key([self._csv_path(s) for s in symbols], {'mode': mode})
+            data = self.cache.load(name, key)
+            if data is not None:
+                return data
+
+        frames = clean(*symbols)
+        data = dict((s, frame_to_columns(frames[s])) for s in symbols)
+        if self.cache is not None:
+            self.cache.store(name, key, data)
+        return data
+
+    def _open_convert_csv_files(self):
+        """
+        打开若干csv文件，将数据存入字典。数据源自聚宽的get_ticks
         """
 
-        symbol_iters = {}
+        if self.workers > 1 and len(self.symbol_list) > 1:
+            self._open_convert_csv_files_parallel()
+            return
         for s in self.symbol_list:
-            symbol_iters[s] = self._get_new_bar(s)
-        return symbol_iters
+            self.symbol_data.update(self._load_with_cache([s], 'single', self._clean_csv_file))
+
+    def _open_convert_csv_files_parallel(self):
+        """
+        在进程池中并行读取清洗未命中缓存的csv文件，每个文件一个任务。
+        结果经二进制缓存回到主进程并内存映射，不传递DataFrame
+        """
+
+        keys = dict.fromkeys(self.symbol_list)
+        if self.cache is not None:
+            for s in self.symbol_list:
+                keys[s] = self.cache.make_key([self._csv_path(s)], {'mode': 'single'})
+                data = self.cache.load(s, keys[s])
+                if data is not None:
+                    self.symbol_data.update(data)
+        pending = [s for s in self.symbol_list if s not in self.symbol_data]
+        if not pending:
+            return
+
+        cache_dir = self.cache.cache_dir if self.cache is not None else None
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+            futures = dict((s, pool.submit(_load_csv_to_cache, self._csv_path(s), cache_dir, s, keys[s]))
+                           for s in pending)
+            for s in pending:
+                columns = futures[s].result()
+                if columns is None:
+                    self.symbol_data.update(self.cache.load(s, keys[s]))
+                else:
+                    self.symbol_data[s] = columns
+
+    def _clean_csv_file(self, symbol):
+        """
+        读取并清洗单个csv文件，返回{symbol: DataFrame}
+        """
+
+        return {symbol: read_tick_csv(self._csv_path(symbol))}
+
+    def _open_convert_csv_files_in_pairs(self):
+        """
+        打开一对csv文件，将数据存入字典。数据源自聚宽的get_ticks
+        """
+
+        self.symbol_data.update(self._load_with_cache(self.symbol_list, 'pairs', self._clean_csv_files_in_pairs))
+
+    def _clean_csv_files_in_pairs(self, symbol_x, symbol_y):
+        """
+        读取一对csv文件，按秒对齐后返回{symbol: DataFrame}。
+        两个文件按距各自首条行情当日零点的时间对齐，不同日期的文件（如A2001_2019-11-05与A2001_2019-11-06）
+        按交易时段对齐；对齐后各品种的time列仍为其自身日期的时间
+        """
+
+        # 分别打开两个文件，提取时间并截断到整秒（int64纳秒），丢弃秒级重复数据，保留第一条
+        symbol_data_x = pd.read_csv(self._csv_path(symbol_x), header=0, index_col=0)
+        symbol_data_x['time'] = parse_tick_time(symbol_data_x['time']) // NANOS_PER_SECOND * NANOS_PER_SECOND
+        symbol_data_x.drop_duplicates(subset='time', keep='first', inplace=True)
+
+        symbol_data_y = pd.read_csv(self._csv_path(symbol_y), header=0, index_col=0)
+        symbol_data_y['time'] = parse_tick_time(symbol_data_y['time']) // NANOS_PER_SECOND * NANOS_PER_SECOND
+        symbol_data_y.drop_duplicates(subset='time', keep='first', inplace=True)
+
+        # 对齐键为距首条行情当日零点的纳秒数，而非time % NANOS_PER_DAY：夜盘跨零点时仍保持先后顺序。
+        # 仅有时分秒的数据当日零点为0，对齐键即time
+        day_x = self._first_day(symbol_data_x['time'])
+        day_y = self._first_day(symbol_data_y['time'])
+        symbol_data_x['time'] -= day_x
+        symbol_data_y['time'] -= day_y
+
+        # 将两个数据进行拼接，并以整数time列进行数据对齐，对于缺失数据，以前一秒来补齐
+        symbol_data_xy = symbol_data_x.merge(symbol_data_y, how='outer', on='time')
+        symbol_data_xy.sort_values(by='time', inplace=True, ascending=True)
+        symbol_data_xy.reset_index(drop=True, inplace=True)
+        symbol_data_xy.ffill(inplace=True)
+        symbol_data_xy['time_x'] = symbol_data_xy['time'] + day_x
+        symbol_data_xy['time_y'] = symbol_data_xy['time'] + day_y
+        frames = {
+            symbol_x: symbol_data_xy[['time_x', 'current_x', 'high_x', 'low_x', 'volume_x', 'money_x', 'position_x',
+                                      'a1_v_x', 'a1_p_x', 'b1_v_x', 'b1_p_x']],
+            symbol_y: symbol_data_xy[['time_y', 'current_y', 'high_y', 'low_y', 'volume_y', 'money_y', 'position_y',
+                                      'a1_v_y', 'a1_p_y', 'b1_v_y', 'b1_p_y']],
+        }
+
+        # 在merge后，对列统一重命名
+        for frame in frames.values():
+            frame.columns = ['time', 'current', 'high', 'low', 'volume', 'money', 'position', 'a1_v',
+                             'a1_p', 'b1_v', 'b1_p']
+        return frames
+
+    @staticmethod
+    def _first_day(times):
+        """
+        返回首条行情当日零点的纳秒时间；仅有时分秒的数据返回0
+        """
+
+        return _tick_day(times.iloc[0]) if len(times) else 0
+
+
+class BarView(object):
+    """
+    一条行情的轻量视图，按列名从列数组中取值，不复制数据。
+    与iterrows()返回的Series用法一致，支持bar['current']和bar.current
+    """
+
+    __slots__ = ('_columns', '_i')
+
+    def __init__(self, columns, i):
+        self._columns = columns
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._columns[key][self._i]
+
+    def __getattr__(self, name):
+        try:
+            return self._columns[name][self._i]
+        except KeyError:
+            raise AttributeError(name)
+
+    def keys(self):
+        return [k for k in self._columns if k != 'index']
+
+    def __repr__(self):
+        return 'BarView(%s)' % ', '.join('%s=%r' % (k, self[k]) for k in self.keys())
 
 
 if __name__ == '__main__':
@@ -266,7 +752,7 @@ if __name__ == '__main__':
     while i < 10:
         data_handler.update_bars()
         i += 1
-    print(data_handler.latest_symbol_data['A2001_2019-11-05'][-1])
+    print(data_handler.get_latest_bar('A2001_2019-11-05'))
     # print(data_handler.get_latest_bars('A1605_2016-01-05', 3))
     # print(data_handler.get_latest_bar_datetime('A1605_2016-01-05'))
     # print(data_handler.get_latest_bar_value('A1605_2016-01-05', 'current'))
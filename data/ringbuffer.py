@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+# ringbuffer.py
+
+from __future__ import print_function
+
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    定长环形缓冲区，基于NumPy数组存储最新的capacity条数据，内存占用固定。
+    每条数据同时写入位置i和i+capacity（双倍存储），因此最新N条数据总是一段连续内存，
+    latest(N)直接返回视图，不需要拼接或拷贝。
+    视图与缓冲区共享内存：此后再写入超过capacity - N条数据，视图中较早的数据会被新数据覆盖，
+    需要跨行情保存时由调用方copy()
+    """
+
+    def __init__(self, capacity, dtype=np.float64, shape=()):
+        """
+        初始化
+        Parameters:
+        capacity - 最多保留的数据条数
+        dtype - 数据类型，时间等非数值列可用object
+        shape - 单条数据的形状，()为标量，(k,)为一行k列
+        """
+        if capacity < 1:
+            raise ValueError("RingBuffer capacity must be positive")
+        self.capacity = int(capacity)
+        self.shape = tuple(shape)
+        self._data = np.empty((2 * self.capacity,) + self.shape, dtype=dtype)
+        # 下一条数据的写入位置
+        self._pos = 0
+        # 当前保存的数据条数
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def append(self, value):
+        """
+        写入一条数据，缓冲区已满时覆盖最旧的一条
+        """
+        pos = self._pos
+        self._data[pos] = value
+        self._data[pos + self.capacity] = value
+        pos += 1
+        self._pos = 0 if pos == self.capacity else pos
+        if self._size < self.capacity:
+            self._size += 1
+
+    def latest(self, N=1):
+        """
+        返回最新N条数据的只读视图，按时间先后排列；不足N条时返回全部。
+        视图只保证在下一次append之前有效，见类说明
+        """
+        n = min(N, self._size)
+        end = self._pos + self.capacity
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def last(self):
+        """
+        返回最新一条数据；shape不为()时为一行的视图，与latest()相同会被后续写入覆盖
+        """
+        if self._size == 0:
+            raise IndexError("RingBuffer is empty")
+        return self._data[self._pos + self.capacity - 1]
+
+    def resize(self, capacity):
+        """
+        修改容量，保留最新的min(当前条数, capacity)条数据，缩小时回收更早的数据
+        """
+        if capacity < 1:
+            raise ValueError("RingBuffer capacity must be positive")
+        kept = self.latest(capacity).copy()
+        self.capacity = int(capacity)
+        self._data = np.empty((2 * self.capacity,) + self.shape, dtype=self._data.dtype)
+        self.clear()
+        for value in kept:
+            self.append(value)
+
+    def clear(self):
+        """
+        清空缓冲区，保留已分配的内存
+        """
+        self._pos = 0
+        self._size = 0
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# store.py
+
+from __future__ import print_function
+
+import json
+import os, os.path
+import queue
+import re
+
+import numpy as np
+
+from .data import ArrayDataHandler, frame_to_columns, read_tick_csv
+
+
+# 按天存储的聚宽tick文件名，如A2001_2019-11-05.csv
+DAY_FILE_PATTERN = re.compile(r'^(?P<contract>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.csv$')
+
+
+class TickStore(object):
+    """
+    多日tick数据仓库。同一合约的所有交易日按列合并存储，每列一个二进制文件（<root>/<合约>/<列名>.bin），
+    读取时以内存映射方式打开，只有实际访问到的行才会被读入内存。
+    index.json记录每个合约每列的dtype，以及每个交易日在文件中的行区间[start, stop)。
+    新交易日某列的dtype不能无损转换为已入库的dtype时（如整数列出现NaN后为float64），该列整体提升为二者的公共类型
+    """
+
+    def __init__(self, root):
+        """
+        初始化
+        Parameters:
+        root - 仓库文件夹路径，不存在时在写入时创建
+        """
+        self.root = root
+        self.index = self._read_index()
+
+    def _index_path(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (IOError, OSError):
+            return {'contracts': {}}
+
+    def _write_index(self):
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path())
+
+    def contracts(self):
+        """
+        返回仓库中的全部合约
+        """
+        return sorted(self.index['contracts'])
+
+    def dates(self, contract):
+        """
+        返回合约已入库的全部交易日
+        """
+        return sorted(self.index['contracts'][contract]['dates'])
+
+    def add_day(self, contract, date, columns, overwrite=False):
+        """
+        将一个交易日的数据追加到合约的列文件末尾，并更新索引
+        Parameters:
+        contract - 合约代码，如A2001
+        date - 交易日，'YYYY-MM-DD'
+        columns - {列名: 数组}，见frame_to_columns
+        overwrite - 该交易日已入库时是否重新写入；旧数据所在行不会回收
+        Returns - 是否写入
+        """
+
+        entry = self.index['contracts'].setdefault(contract, {'rows': 0, 'columns': {}, 'dates': {}})
+        if date in entry['dates'] and not overwrite:
+            return False
+        if entry['columns'] and set(entry['columns']) != set(columns):
+            raise ValueError("Columns of %s %s do not match the store" % (contract, date))
+        for col, arr in columns.items():
+            if arr.dtype.kind not in 'biuf':
+                raise ValueError("Column %s of %s has non-numeric dtype %s" % (col, contract, arr.dtype))
+        if not entry['columns']:
+            for col, arr in columns.items():
+                entry['columns'][col] = arr.dtype.str
+
+        contract_dir = os.path.join(self.root, contract)
+        if not os.path.isdir(contract_dir):
+            os.makedirs(contract_dir)
+        for col, arr in columns.items():
+            dtype = np.dtype(entry['columns'][col])
+            if not np.can_cast(arr.dtype, dtype, 'safe'):
+                self._promote_column(contract, col, np.promote_types(dtype, arr.dtype))
+        start = entry['rows']
+        stop = start + len(columns['time'])
+        for col, dtype in entry['columns'].items():
+            dtype = np.dtype(dtype)
+            with open(os.path.join(contract_dir, '%s.bin' % col), 'ab') as f:
+                # 丢弃上次写入中断时残留的、未记入索引的数据
+                f.truncate(start * dtype.itemsize)
+                f.write(np.ascontiguousarray(columns[col], dtype=dtype).tobytes())
+        entry['rows'] = stop
+        entry['dates'][date] = [start, stop]
+        self._write_index()
+        return True
+
+    def _promote_column(self, contract, col, dtype):
+        """
+        将合约已入库的一列转换为dtype，重写列文件并更新索引
+        """
+
+        entry = self.index['contracts'][contract]
+        path = os.path.join(self.root, contract, '%s.bin' % col)
+        if entry['rows']:
+            stored = np.fromfile(path, dtype=np.dtype(entry['columns'][col]), count=entry['rows'])
+            tmp = path + '.tmp'
+            stored.astype(dtype).tofile(tmp)
+            os.replace(tmp, path)
+        entry['columns'][col] = dtype.str
+        self._write_index()
+
+    def consolidate(self, csv_dir, contracts=None):
+        """
+        将csv_dir中按天存储的tick文件（<合约>_<YYYY-MM-DD>.csv）按交易日顺序逐个清洗并入库，已入库的交易日跳过
+        Parameters:
+        csv_dir - csv文件路径
+        contracts - 只处理这些合约，默认全部
+        Returns - 新入库的文件数
+        """
+
+        day_files = []
+        for name in os.listdir(csv_dir):
+            m = DAY_FILE_PATTERN.match(name)
+            if m is not None and (contracts is None or m.group('contract') in contracts):
+                day_files.append((m.group('contract'), m.group('date'), name))
+
+        added = 0
+        for contract, date, name in sorted(day_files):
+            entry = self.index['contracts'].get(contract)
+            if entry is not None and date in entry['dates']:
+                continue
+            columns = frame_to_columns(read_tick_csv(os.path.join(csv_dir, name)))
+            added += self.add_day(contract, date, columns)
+        return added
+
+    def load(self, contract, start_date=None, end_date=None):
+        """
+        读取合约在[start_date, end_date]内的数据，返回{列名: 只读数组}。
+        交易日在文件中连续时返回内存映射的切片，不读入内存；否则拼接为新数组
+        Parameters:
+        contract - 合约代码
+        start_date, end_date - 'YYYY-MM-DD'，默认不限
+        """
+
+        try:
+            entry = self.index['contracts'][contract]
+        except KeyError:
+            print("That contract is not available in the tick store.")
+            raise
+        ranges = [entry['dates'][d] for d in sorted(entry['dates'])
+                  if (start_date is None or d >= start_date) and (end_date is None or d <= end_date)]
+
+        data = {}
+        for col, dtype in entry['columns'].items():
+            if not ranges:
+                arr = np.empty(0, dtype=dtype)
+            else:
+                mm = np.asarray(np.memmap(os.path.join(self.root, contract, '%s.bin' % col), dtype=np.dtype(dtype),
+                                          mode='r', shape=(entry['rows'],)))
+                if all(ranges[i][0] == ranges[i - 1][1] for i in range(1, len(ranges))):
+                    arr = mm[ranges[0][0]:ranges[-1][1]]
+                else:
+                    arr = np.concatenate([mm[a:b] for a, b in ranges])
+                    arr.flags.writeable = False
+            data[col] = arr
+        return data
+
+
+class TickStoreDataHandler(ArrayDataHandler):
+    """
+    从TickStore读取多日tick数据进行回放，get_latest_*接口与HistoricCSVDataHandler一致
+    """
+    def __init__(self, events, store_dir, symbol_list, start_date=None, end_date=None):
+        """
+        初始化
+        Parameters:
+        events - 事件队列，即queue.Queue()
+        store_dir - TickStore仓库路径
+        symbol_list - 合约代码列表，如['A2001']
+        start_date, end_date - 回测区间，'YYYY-MM-DD'，默认为仓库中的全部交易日
+        """
+        super(TickStoreDataHandler, self).__init__(events, symbol_list)
+        self.store = TickStore(store_dir)
+        for s in self.symbol_list:
+            self.symbol_data[s] = self.store.load(s, start_date, end_date)
+            if len(self.symbol_data[s]['time']) == 0:
+                raise ValueError("No ticks for %s between %s and %s" % (s, start_date, end_date))
+
+
+if __name__ == '__main__':
+    store = TickStore('D:\\tick_data\\store')
+    print(store.consolidate('D:\\tick_data\\A'))
+    data_handler = TickStoreDataHandler(events=queue.Queue(), store_dir='D:\\tick_data\\store',
+                                        symbol_list=['A2001'], start_date='2019-11-01', end_date='2019-11-30')
+    i = 0
+    while i < 10:
+        data_handler.update_bars()
+        i += 1
+    print(data_handler.get_latest_bar('A2001'))
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# streaming.py
+
+from __future__ import print_function
+
+import heapq
+import itertools
+import os, os.path
+import queue
+
+import numpy as np
+import pandas as pd
+
+from event import MarketEvent
+from .data import BufferedDataHandler, NANOS_PER_SECOND, _tick_day, parse_tick_time
+
+
+def iter_csv_chunks(path, chunksize, dedup=False):
+    """
+    生成器，按块读取聚宽tick数据csv，逐块解析time列，每次产出一个清洗好的DataFrame块
+    Parameters:
+    path - csv文件路径
+    chunksize - 每块行数
+    dedup - 是否将time截断到整秒并丢弃秒级重复数据（保留第一条），与配对数据的清洗方式一致
+    """
+
+    last_time = None
+    for chunk in pd.read_csv(path, header=0, index_col=0, chunksize=chunksize):
+        chunk['time'] = parse_tick_time(chunk['time'])
+        if dedup:
+            chunk['time'] = chunk['time'] // NANOS_PER_SECOND * NANOS_PER_SECOND
+            chunk = chunk.drop_duplicates(subset='time', keep='first')
+            # 上一块最后一秒的数据可能延续到本块开头
+            if last_time is not None:
+                chunk = chunk[chunk['time'].to_numpy() != last_time]
+        if len(chunk):
+            last_time = chunk['time'].iloc[-1]
+            yield chunk
+
+
+def iter_chunk_rows(chunks, columns):
+    """
+    生成器，将DataFrame块展开为逐行的(index, time, 数值行)，数值行为float64数组，按columns排列
+    """
+
+    for chunk in chunks:
+        index = chunk.index.to_numpy()
+        times = chunk['time'].to_numpy(dtype=np.int64)
+        values = chunk[columns].to_numpy(dtype=np.float64)
+        for i in range(len(values)):
+            yield index[i], times[i], values[i]
+
+
+def _shift_rows(rows, offset):
+    """
+    生成器，将逐行数据流的time减去offset
+    """
+
+    for index, time, values in rows:
+        yield index, time - offset, values
+
+
+def merge_streams(streams):
+    """
+    生成器，以堆归并k个按时间排序的逐行数据流，按时间先后产出(time, [(k, 数值行), ...])，
+    同一时间的各品种数据合并为一次产出。每条tick的开销为O(log k)，不需要物化全部数据的外连接
+    Parameters:
+    streams - 逐行数据流列表，每个流产出(index, time, 数值行)，见iter_chunk_rows
+    """
+
+    heap = []
+    for k, rows in enumerate(streams):
+        row = next(rows, None)
+        if row is not None:
+            heap.append((row[1], k, row[2]))
+    heapq.heapify(heap)
+
+    while heap:
+        time = heap[0][0]
+        updates = []
+        while heap and heap[0][0] == time:
+            k, values = heap[0][1], heap[0][2]
+            updates.append((k, values))
+            row = next(streams[k], None)
+            if row is None:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (row[1], k, row[2]))
+        yield time, updates
+
+
+class StreamingCSVDataHandler(BufferedDataHandler):
+    """
+    流式读取csv文件，按块解析，只在环形缓冲区中保留最近lookback条行情，峰值内存与文件长度无关。
+    适用于多个月的大文件。默认与HistoricCSVDataHandler的非配对模式一样，每次update_bars每个品种前进1条；
+    align=True时对任意数量的品种按时间归并对齐，每次update_bars推进到下一个时间点，没有新数据的品种以前值补齐。
+    与配对数据一致，对齐的是距各品种首条行情当日零点的时间，不同日期的文件按交易时段对齐，各品种的time仍为其自身日期的时间
+    """
+    def __init__(self, events, csv_dir, symbol_list, lookback=None, chunksize=20000, dedup=False, align=False):
+        """
+        初始化
+        Parameters:
+        events - 事件队列，即queue.Queue()
+        csv_dir - csv文件路径
+        symbol_list - 品种标签，采用csv文件名
+        lookback - 每个品种至少保留的行情条数，默认由request_lookback决定
+        chunksize - 每次从csv读取的行数
+        dedup - 是否丢弃秒级重复数据，见iter_csv_chunks
+        align - 是否按时间对齐所有品种，见merge_streams。配合dedup=True时与配对数据的清洗方式一致
+        """
+        super(StreamingCSVDataHandler, self).__init__(events, symbol_list, lookback)
+        self.csv_dir = csv_dir
+        self.chunksize = chunksize
+        self.dedup = dedup
+        self.align = align
+        # 每个品种的逐行生成器，及其首条行情当日零点的纳秒时间
+        self.symbol_iters = {}
+        self.symbol_days = {}
+
+        for s in self.symbol_list:
+            self._open_stream(s)
+
+        if self.align:
+            self.merged_iter = merge_streams([_shift_rows(self.symbol_iters[s], self.symbol_days[s])
+                                              for s in self.symbol_list])
+            # 对齐后各品种的最新数值行，首次出现之前为NaN，与配对数据外连接后的ffill一致
+            self.last_values = [np.full(len(self.symbol_columns[s]), np.nan) for s in self.symbol_list]
+            self.bar_count = 0
+
+    def _open_stream(self, symbol):
+        """
+        打开品种的csv数据流，读取第一块以确定列名，并初始化环形缓冲区
+        """
+
+        chunks = iter_csv_chunks(os.path.join(self.csv_dir, '%s.csv' % symbol), self.chunksize, self.dedup)
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("No ticks in %s.csv" % symbol)
+        columns = [c for c in first.columns if c != 'time']
+        self.symbol_days[symbol] = _tick_day(first['time'].iloc[0])
+        self.symbol_iters[symbol] = iter_chunk_rows(itertools.chain([first], chunks), columns)
+        self._initialize_buffers(symbol, columns, first.index.dtype)
+
+    def update_bars(self):
+        """
+        模拟实盘数据接收，每个品种从数据流中读取1条新数据，存入环形缓冲区
+        """
+
+        if self.align:
+            self._update_aligned_bars()
+            return
+        for s in self.symbol_list:
+            try:
+                index, time, values = next(self.symbol_iters[s])
+            except StopIteration:
+                self.continue_backtest = False
+            else:
+                self._append_bar(s, index, time, values)
+        self.events.put(MarketEvent())
+
+    def _update_aligned_bars(self):
+        """
+        从归并后的数据流中读取下一个时间点，所有品种各存入1条以前值补齐的数据，index为对齐后的行号
+        """
+
+        try:
+            time, updates = next(self.merged_iter)
+        except StopIteration:
+            self.continue_backtest = False
+        else:
+            for k, values in updates:
+                self.last_values[k] = values
+            for k, s in enumerate(self.symbol_list):
+                self._append_bar(s, self.bar_count, time + self.symbol_days[s], self.last_values[k])
+            self.bar_count += 1
+        self.events.put(MarketEvent())
+
+
+if __name__ == '__main__':
+    data_handler = StreamingCSVDataHandler(events=queue.Queue(), csv_dir='D:\\tick_data\\test_data',
+                                           symbol_list=['A2001_2019-11-05'], lookback=400, chunksize=5000)
+    i = 0
+    while i < 10:
+        data_handler.update_bars()
+        i += 1
+    print(data_handler.get_latest_bar('A2001_2019-11-05'))
+    print(data_handler.get_latest_bars_values('A2001_2019-11-05', 'current', 5))
@@ -1,3 +1,4 @@
 # from .event import MarketEvent
-__all__ = ['Event', 'MarketEvent', 'SignalEvent', 'OrderEvent', 'FillEvent']
-from .event import *
\ No newline at end of file
+__all__ = ['Event', 'MarketEvent', 'SignalEvent', 'OrderEvent', 'FillEvent', 'EventType', 'SignalType', 'Direction', 'OrderType', 'EventBus', 'ThreadSafeEventBus']
+from .event import *
+from .bus import *
\ No newline at end of file
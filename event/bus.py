@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# bus.py
+"""
+事件总线：事件队列与按事件类分发
+"""
+
+from __future__ import print_function
+
+from collections import deque
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class EventBus(object):
+    """
+    单线程事件总线。以collections.deque作为事件队列，没有锁；
+    按事件类注册处理函数，分发时为一次字典查找，不再逐个比较event.type字符串。
+    保留put/get/qsize/empty，可以替代原来的queue.Queue
+    """
+
+    def __init__(self):
+        self._events = deque()
+        # {事件类: [处理函数]}，按注册顺序调用
+        self._handlers = {}
+        # {事件类: 该类及其父类的全部处理函数}，在subscribe时清空
+        self._dispatch_table = {}
+
+    def subscribe(self, event_cls, handler):
+        """
+        注册处理函数，event_cls及其子类的事件都会交给handler
+        Parameters:
+        event_cls - 事件类，如MarketEvent
+        handler - 处理函数，参数为事件对象
+        """
+
+        self._handlers.setdefault(event_cls, []).append(handler)
+        self._dispatch_table.clear()
+
+    def _resolve(self, event_cls):
+        """
+        按MRO汇总event_cls的处理函数，并缓存到分发表
+        """
+
+        handlers = []
+        for cls in reversed(event_cls.__mro__):
+            handlers.extend(self._handlers.get(cls, ()))
+        self._dispatch_table[event_cls] = handlers
+        return handlers
+
+    def put(self, event, block=True, timeout=None):
+        """
+        事件入队，None被忽略（如Portfolio未生成订单时）
+        """
+
+        if event is not None:
+            self._events.append(event)
+
+    def get(self, block=False, timeout=None):
+        """
+        取出最早的事件，队列为空时抛出queue.Empty。单线程下不会有其他线程写入，因此不阻塞
+        """
+
+        try:
+            return self._events.popleft()
+        except IndexError:
+            raise queue.Empty
+
+    def qsize(self):
+        return len(self._events)
+
+    def empty(self):
+        return not self._events
+
+    def dispatch(self):
+        """
+        依次分发队列中的事件直到队列为空，处理过程中新产生的事件也会被分发
+        Returns - 分发的事件数
+        """
+
+        events = self._events
+        table = self._dispatch_table
+        n = 0
+        while events:
+            event = events.popleft()
+            handlers = table.get(event.__class__)
+            if handlers is None:
+                handlers = self._resolve(event.__class__)
+            for handler in handlers:
+                handler(event)
+            n += 1
+        return n
+
+
+class ThreadSafeEventBus(EventBus):
+    """
+    线程安全的事件总线，供实盘行情线程向回测主循环推送事件。get支持阻塞等待
+    """
+
+    def __init__(self):
+        super(ThreadSafeEventBus, self).__init__()
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def subscribe(self, event_cls, handler):
+        with self._not_empty:
+            super(ThreadSafeEventBus, self).subscribe(event_cls, handler)
+
+    def put(self, event, block=True, timeout=None):
+        if event is not None:
+            with self._not_empty:
+                self._events.append(event)
+                self._not_empty.notify()
+
+    def get(self, block=False, timeout=None):
+        """
+        取出最早的事件。block为True时等待至多timeout秒，超时抛出queue.Empty
+        """
+
+        with self._not_empty:
+            if block and not self._events:
+                self._not_empty.wait_for(lambda: self._events, timeout)
+            try:
+                return self._events.popleft()
+            except IndexError:
+                raise queue.Empty
+
+    def dispatch(self):
+        """
+        依次分发队列中的事件直到队列为空。取事件时加锁，处理函数在锁外执行
+        """
+
+        n = 0
+        while True:
+            try:
+                event = self.get()
+            except queue.Empty:
+                return n
+            handlers = self._dispatch_table.get(event.__class__)
+            if handlers is None:
+                with self._not_empty:
+                    handlers = self._resolve(event.__class__)
+            for handler in handlers:
+                handler(event)
+            n += 1
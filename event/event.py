@@ -7,48 +7,120 @@
 
 from __future__ import print_function
 
+from enum import IntEnum
+
+
+class _LegacyEnum(IntEnum):
+    """
+    兼容旧接口的IntEnum：与'MARKET'、'LONG'、'BUY'等旧字符串比较时按名称比较，
+    因此仍在判断event.type == 'MARKET'、signal_type == 'LONG'的策略行为不变；其余按整数比较。
+    注意哈希值仍为整数的哈希值，字符串和枚举不能混用作字典的键
+    """
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self._name_ == other
+        return int.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = IntEnum.__hash__
+
+
+class EventType(_LegacyEnum):
+    """
+    事件类型
+    """
+    MARKET = 0
+    SIGNAL = 1
+    ORDER = 2
+    FILL = 3
+
+
+class SignalType(_LegacyEnum):
+    """
+    信号方向
+    """
+    EXIT = 0
+    LONG = 1
+    SHORT = -1
+
+
+class Direction(_LegacyEnum):
+    """
+    订单、成交方向，值即头寸变化的符号
+    """
+    BUY = 1
+    SELL = -1
+
+
+class OrderType(_LegacyEnum):
+    """
+    订单类型，市价订单MKT，限价订单LMT
+    """
+    MKT = 0
+    LMT = 1
+
+
+def _to_enum(enum_cls, value):
+    """
+    兼容旧接口：将'LONG'、'BUY'、'MKT'等字符串转换为对应的枚举
+    """
+
+    if value.__class__ is enum_cls:
+        return value
+    if isinstance(value, str):
+        return enum_cls[value]
+    return enum_cls(value)
+
 
 class Event(object):
     """
-    基类，由其他能够在交易过程中触发的专项事件来继承
+    基类，由其他能够在交易过程中触发的专项事件来继承。
+    各事件类使用__slots__，没有__dict__；type为类属性，不占实例空间
     """
-    pass
+    __slots__ = ()
 
 
 class MarketEvent(Event):
     """
-    处理接收到的新市场行情
+    处理接收到的新市场行情。没有任何内容，因此全局只有一个实例，MarketEvent()总是返回同一个对象
     """
+    __slots__ = ()
+    type = EventType.MARKET
 
-    def __init__(self):
-        """
-        初始化MarketEvent
-        """
-        self.type = 'MARKET'
+    def __new__(cls):
+        return _MARKET_EVENT
+
+
+_MARKET_EVENT = object.__new__(MarketEvent)
 
 
 class SignalEvent(Event):
     """
     处理Strategy对象发出的交易信号，由Portfolio对象接收并处理
     """
+    __slots__ = ('strategy_id', 'symbol', 'datetime', 'signal_type', 'strength')
+    type = EventType.SIGNAL
 
     def __init__(self, strategy_id, symbol, datetime, signal_type, strength):
         """
         初始化SignalEvent
 
         Parameters:
-        strategy_id - strategy编号， 暂未用上
+        strategy_id - strategy编号，Backtest同时运行多个策略时，据此将信号交给该策略的Portfolio
         symbol - 品种标签，最好采用csv文件名
         datetime - 生成信号时的timestamp
-        signal_type - ’LONG’ ， ’SHORT’ ， ‘EXIT’
+        signal_type - SignalType.LONG, SignalType.SHORT, SignalType.EXIT，也可传入’LONG’ ， ’SHORT’ ， ‘EXIT’
         strength - 信号强度，在构建portfo时权衡下单量的大小。主要用于配对交易
         """
 
-        self.type = 'SIGNAL'
         self.strategy_id = strategy_id
         self.symbol = symbol
         self.datetime = datetime
-        self.signal_type = signal_type
+        self.signal_type = signal_type if signal_type.__class__ is SignalType else _to_enum(SignalType, signal_type)
         self.strength = strength
 
 
@@ -56,37 +128,42 @@ class OrderEvent(Event):
     """
     处理向交易系统发送的订单
     """
+    __slots__ = ('symbol', 'order_type', 'quantity', 'direction', 'strategy_id')
+    type = EventType.ORDER
 
-    def __init__(self, symbol, order_type, quantity, direction):
+    def __init__(self, symbol, order_type, quantity, direction, strategy_id=None):
         """
         初始化OrderEvent
         Parameters:
         symbol - 品种标签，最好采用csv文件名
-        order_type - 市价订单’MKT’或 限价订单’LMT’
+        order_type - 市价订单OrderType.MKT或 限价订单OrderType.LMT，也可传入’MKT’ ， ’LMT’
         quantity - 非负整数
-        direction - ’BUY’ ， ’SELL’
+        direction - Direction.BUY, Direction.SELL，也可传入’BUY’ ， ’SELL’
+        strategy_id - 发出信号的strategy编号，成交时传给FillEvent
         """
 
-        self.type = 'ORDER'
         self.symbol = symbol
-        self.order_type = order_type
+        self.order_type = order_type if order_type.__class__ is OrderType else _to_enum(OrderType, order_type)
         self.quantity = quantity
-        self.direction = direction
+        self.direction = direction if direction.__class__ is Direction else _to_enum(Direction, direction)
+        self.strategy_id = strategy_id
 
     def print_order(self):
         """
         输出订单内容
         """
 
-        print("Order: Symbol=%s, Type=%s, Quantity=%s, Direction=%s" % (self.symbol, self.order_type, self.quantity, self.direction))
+        print("Order: Symbol=%s, Type=%s, Quantity=%s, Direction=%s" % (self.symbol, self.order_type.name, self.quantity, self.direction.name))
 
 
 class FillEvent(Event):
     """
     记录订单成交情况，因此框架为回测框架，所以成交均为虚拟成交。实盘模型应改为捕捉成交反馈记录。
     """
+    __slots__ = ('timeindex', 'symbol', 'exchange', 'quantity', 'direction', 'fill_cost', 'commission', 'strategy_id')
+    type = EventType.FILL
 
-    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, commission=None):
+    def __init__(self, timeindex, symbol, exchange, quantity, direction, fill_cost, commission=None, strategy_id=None):
         """
         初始化FillEvent
         Parameters:
@@ -94,22 +171,23 @@ class FillEvent(Event):
         symbol - 品种标签，最好采用csv文件名
         exchange - 交易所，暂未使用
         quantity - 成交量
-        direction - 成交方向(’BUY’ ， ’SELL’)
+        direction - 成交方向(Direction.BUY, Direction.SELL，也可传入’BUY’ ， ’SELL’)
         fill_cost - 成交金额
         commission - 费用
+        strategy_id - 订单对应的strategy编号，由该策略的Portfolio处理
         """
-        self.type = 'FILL'
         self.timeindex = timeindex
         self.symbol = symbol
         self.exchange = exchange
         self.quantity = quantity
-        self.direction = direction
+        self.direction = direction if direction.__class__ is Direction else _to_enum(Direction, direction)
         self.fill_cost = fill_cost
         # 计算手续费
         if commission is None:
             self.commission = self.calculate_ib_commission()
         else:
             self.commission = commission
+        self.strategy_id = strategy_id
 
     def calculate_ib_commission(self):
         """
@@ -120,3 +198,44 @@ class FillEvent(Event):
         full_cost = 0.000345 * self.quantity
 
         return full_cost
+
+
+if __name__ == '__main__':
+    # 对比旧的__dict__事件类与__slots__事件类的创建和属性访问开销
+    import sys
+    import timeit
+
+    class DictMarketEvent(object):
+        def __init__(self):
+            self.type = 'MARKET'
+
+    class DictSignalEvent(object):
+        def __init__(self, strategy_id, symbol, datetime, signal_type, strength):
+            self.type = 'SIGNAL'
+            self.strategy_id = strategy_id
+            self.symbol = symbol
+            self.datetime = datetime
+            self.signal_type = signal_type
+            self.strength = strength
+
+    number = 1000000
+    cases = [
+        ("MarketEvent()", "DictMarketEvent()", "MarketEvent()"),
+        ("SignalEvent()", "DictSignalEvent(1, 'A', 0, 'LONG', 1.0)",
+         "SignalEvent(1, 'A', 0, SignalType.LONG, 1.0)"),
+        ("type check", "e.type == 'MARKET'", "e.type is MARKET"),
+        ("legacy type check", "e.type == 'MARKET'", "e.type == 'MARKET'"),
+        ("signal_type check", "s.signal_type == 'LONG'", "s.signal_type is LONG"),
+    ]
+    legacy_ns = {'DictMarketEvent': DictMarketEvent, 'DictSignalEvent': DictSignalEvent,
+                 'e': DictMarketEvent(), 's': DictSignalEvent(1, 'A', 0, 'LONG', 1.0)}
+    slots_ns = {'MarketEvent': MarketEvent, 'SignalEvent': SignalEvent, 'SignalType': SignalType,
+                'MARKET': EventType.MARKET, 'LONG': SignalType.LONG,
+                'e': MarketEvent(), 's': SignalEvent(1, 'A', 0, SignalType.LONG, 1.0)}
+    print("%-20s %12s %12s" % ("", "dict ns/op", "slots ns/op"))
+    for name, legacy, slots in cases:
+        t0 = min(timeit.repeat(legacy, globals=legacy_ns, number=number, repeat=3)) / number * 1e9
+        t1 = min(timeit.repeat(slots, globals=slots_ns, number=number, repeat=3)) / number * 1e9
+        print("%-20s %12.1f %12.1f" % (name, t0, t1))
+    print("%-20s %12d %12d" % ("bytes per signal", sys.getsizeof(legacy_ns['s']) + sys.getsizeof(legacy_ns['s'].__dict__),
+                               sys.getsizeof(slots_ns['s'])))
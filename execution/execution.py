@@ -11,7 +11,7 @@ try:
 except ImportError:
     import queue
 
-from event import FillEvent, OrderEvent
+from event import FillEvent, OrderEvent, EventType, Direction, OrderType
 
 
 class ExecutionHandler(object):
@@ -30,6 +30,12 @@ class ExecutionHandler(object):
         """
         raise NotImplementedError("Should implement execute_order()")
 
+    def subscribe(self, events):
+        """
+        在事件总线上注册execute_order，处理OrderEvent
+        """
+        events.subscribe(OrderEvent, self.execute_order)
+
 
 class SimulatedExecutionHandler(ExecutionHandler):
     """
@@ -49,14 +55,14 @@ class SimulatedExecutionHandler(ExecutionHandler):
         Parameters:
         event - Contains an Event object with order information.
         """
-        if event.type == 'ORDER':
+        if event.type is EventType.ORDER:
             fill_event = FillEvent(datetime.datetime.utcnow(), event.symbol, '某交易所', event.quantity,
-                                   event.direction, None, commission=1.5)
+                                   event.direction, None, commission=1.5, strategy_id=event.strategy_id)
             self.events.put(fill_event)
 
 
 if __name__ == '__main__':
-    order_event = OrderEvent(direction='BUY', symbol='A2001_2019-11-05', order_type='MKT', quantity=10)
+    order_event = OrderEvent(direction=Direction.BUY, symbol='A2001_2019-11-05', order_type=OrderType.MKT, quantity=10)
     execution_handler = SimulatedExecutionHandler(events=queue.Queue())
     execution_handler.execute_order(order_event)
     print(execution_handler.events.qsize())
\ No newline at end of file
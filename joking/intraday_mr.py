@@ -5,13 +5,13 @@
 from __future__ import print_function
 
 import datetime
+import functools
 
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
 
-from strategy import Strategy
-from event import SignalEvent
+from strategy import Strategy, VectorizedStrategy, RollingOLS, rolling_ols, forward_fill
+from event import SignalEvent, EventType, SignalType
 from backtest import Backtest
 from data import HistoricCSVDataHandler
 from portfolio import Portfolio
@@ -28,18 +28,26 @@ class IntradayOLSMRStrategy(Strategy):
     (for the high threshold) or an exit signal pair are generated (for the
     low threshold).
     """
-    def __init__(self, bars, events, ols_window=100, zscore_low=0.5, zscore_high=3.0):
+    def __init__(self, bars, events, ols_window=100, zscore_low=0.5, zscore_high=3.0, hedge_model=None):
         """
         Initialises the stat arb strategy.
         Parameters:
         bars - The DataHandler object that provides bar information
         events - The Event Queue object.
+        hedge_model - The regression of y on x updated every tick, e.g.
+                      EWRollingOLS or KalmanRegression. Defaults to
+                      RollingOLS(ols_window), equivalent to refitting
+                      sm.OLS(y, x) on the last ols_window ticks.
         """
 
         self.bars = bars
         self.symbol_list = self.bars.symbol_list
         self.events = events
         self.ols_window = ols_window
+        self.hedge_model = RollingOLS(self.ols_window) if hedge_model is None else hedge_model
+        self.hedge_ratio = np.nan
+        # The hedge model keeps its own window, only the newest tick is needed
+        self.bars.request_lookback(1)
         self.zscore_low = zscore_low
         self.zscore_high = zscore_high
         self.pair = ('M2005_2019-11-06', 'RM2001_2019-11-06')
@@ -65,26 +73,26 @@ class IntradayOLSMRStrategy(Strategy):
         # negative of the high zscore threshold
         if zscore_last <= -self.zscore_high and not self.long_market:
             self.long_market = True
-            y_signal = SignalEvent(1, p0, dt, 'LONG', 1.0)
-            x_signal = SignalEvent(1, p1, dt, 'SHORT', hr)
+            y_signal = SignalEvent(self.strategy_id, p0, dt, SignalType.LONG, 1.0)
+            x_signal = SignalEvent(self.strategy_id, p1, dt, SignalType.SHORT, hr)
         # If we’re long the market and between the
         # absolute value of the low zscore threshold
         if abs(zscore_last) <= self.zscore_low and self.long_market:
             self.long_market = False
-            y_signal = SignalEvent(1, p0, dt, 'EXIT', 1.0)
-            x_signal = SignalEvent(1, p1, dt, 'EXIT', 1.0)
+            y_signal = SignalEvent(self.strategy_id, p0, dt, SignalType.EXIT, 1.0)
+            x_signal = SignalEvent(self.strategy_id, p1, dt, SignalType.EXIT, 1.0)
         # If we’re short the market and above
         # the high zscore threshold
         if zscore_last >= self.zscore_high and not self.short_market:
             self.short_market = True
-            y_signal = SignalEvent(1, p0, dt, 'SHORT', 1.0)
-            x_signal = SignalEvent(1, p1, dt, 'LONG', hr)
+            y_signal = SignalEvent(self.strategy_id, p0, dt, SignalType.SHORT, 1.0)
+            x_signal = SignalEvent(self.strategy_id, p1, dt, SignalType.LONG, hr)
         # If we’re short the market and between the
         # absolute value of the low zscore threshold
         if abs(zscore_last) <= self.zscore_low and self.short_market:
             self.short_market = False
-            y_signal = SignalEvent(1, p0, dt, 'EXIT', 1.0)
-            x_signal = SignalEvent(1, p1, dt, 'EXIT', 1.0)
+            y_signal = SignalEvent(self.strategy_id, p0, dt, SignalType.EXIT, 1.0)
+            x_signal = SignalEvent(self.strategy_id, p1, dt, SignalType.EXIT, 1.0)
         return y_signal, x_signal
 
     def calculate_signals_for_pairs(self):
@@ -95,19 +103,19 @@ class IntradayOLSMRStrategy(Strategy):
         We use OLS for this, althought we should ideall use CADF.
         """
 
-        # Obtain the latest window of values for each component of the pair of tickers
-        y = self.bars.get_latest_bars_values(self.pair[0], "current", N=self.ols_window)
-        x = self.bars.get_latest_bars_values(self.pair[1], "current", N=self.ols_window)
-        if y is not None and x is not None:
-            # Check that all window periods are available
-            if len(y) >= self.ols_window and len(x) >= self.ols_window:
-                # Calculate the current hedge ratio using OLS
-                # self.hedge_ratio = sm.OLS(y, x).fit().params[0]>>>>>>>>>>>>>>>
-                self.hedge_ratio = 1
-                # Calculate the current z-score of the residuals
-                spread = y - self.hedge_ratio * x
-                zscore_last = ((spread - spread.mean()) / spread.std())[-1]
-            # Calculate signals and add to events queue
+        # Obtain the latest values of both tickers as one (1, 2, 1) window,
+        # a view of the aligned pair data rather than two separate lookups
+        window = self.bars.get_latest_window(self.pair, ["current"])
+        y, x = window[-1, :, 0]
+        # Update the rolling regression of y on x in O(1)
+        self.hedge_model.update(x, y)
+        # Check that all window periods are available
+        if self.hedge_model.ready:
+            # The current hedge ratio and z-score of the residuals
+            self.hedge_ratio = self.hedge_model.beta
+            zscore_last = self.hedge_model.zscore
+            if zscore_last == zscore_last:
+                # Calculate signals and add to events queue
                 y_signal, x_signal = self.calculate_xy_signals(zscore_last)
                 if y_signal is not None and x_signal is not None:
                     self.events.put(y_signal)
@@ -118,16 +126,65 @@ class IntradayOLSMRStrategy(Strategy):
         Calculate the SignalEvents based on market data.
         """
 
-        if event.type == 'MARKET':
+        if event.type is EventType.MARKET:
             self.calculate_signals_for_pairs()
 
 
+class IntradayOLSMRVectorized(VectorizedStrategy):
+    """
+    Vectorised IntradayOLSMRStrategy for VectorizedBacktest, with the
+    default RollingOLS hedge model. The long and short market flags
+    are hysteresis states (set beyond the high threshold, reset inside
+    the low one), so each is a forward fill of its set/reset ticks.
+    The first two symbols of the backtest are the (y, x) pair.
+    """
+
+    def __init__(self, data, ols_window=100, zscore_low=0.5, zscore_high=3.0):
+        VectorizedStrategy.__init__(self, data)
+        self.ols_window = ols_window
+        self.zscore_low = zscore_low
+        self.zscore_high = zscore_high
+        self.pair = tuple(self.symbol_list[:2])
+
+    def generate_signals(self):
+        y = self.data.values(self.pair[0], 'current')
+        x = self.data.values(self.pair[1], 'current')
+        beta, alpha, zscore = rolling_ols(x, y, self.ols_window)
+        with np.errstate(invalid='ignore'):
+            low = np.abs(zscore) <= self.zscore_low
+            below = zscore <= -self.zscore_high
+            above = zscore >= self.zscore_high
+        # The flags after each tick, and before it
+        long_market = forward_fill(np.where(low, 0.0, np.where(below, 1.0, np.nan)), 0.0)
+        short_market = forward_fill(np.where(low, 0.0, np.where(above, 1.0, np.nan)), 0.0)
+        was_long = np.append(0.0, long_market[:-1]) == 1.0
+        was_short = np.append(0.0, short_market[:-1]) == 1.0
+        # The branches of calculate_xy_signals, later ones overwrite earlier ones
+        enter_long = below & ~was_long
+        exit_long = low & (was_long | enter_long)
+        enter_short = above & ~was_short
+        exit_short = low & (was_short | enter_short)
+
+        signals = np.full((len(self.data), len(self.symbol_list)), np.nan)
+        y_col, x_col = self.symbol_list.index(self.pair[0]), self.symbol_list.index(self.pair[1])
+        for fired, y_signal, x_signal in ((enter_long, SignalType.LONG, SignalType.SHORT),
+                                          (exit_long, SignalType.EXIT, SignalType.EXIT),
+                                          (enter_short, SignalType.SHORT, SignalType.LONG),
+                                          (exit_short, SignalType.EXIT, SignalType.EXIT)):
+            signals[fired, y_col] = y_signal
+            signals[fired, x_col] = x_signal
+        return signals
+
+
 if __name__ == "__main__":
     csv_dir = 'D:\\tick_data\\test_data' # CHANGE THIS!
     symbol_list = ['M2005_2019-11-06', 'RM2001_2019-11-06']
     initial_capital = 100000.0
-    heartbeat = 0.01
+    heartbeat = 0.0
     start_date = 0
+    # Portfolio writes no result files by default (equity.csv is gone);
+    # equity, positions, fills and stats go to results/run-<time>-<suffix>
+    portfolio = functools.partial(Portfolio, results='results')
     backtest = Backtest(csv_dir, symbol_list, initial_capital, heartbeat, start_date, HistoricCSVDataHandler,
-                        SimulatedExecutionHandler, Portfolio, IntradayOLSMRStrategy)
+                        SimulatedExecutionHandler, portfolio, IntradayOLSMRStrategy)
     backtest.simulate_trading()
@@ -5,15 +5,15 @@
 from __future__ import print_function
 
 import datetime
+import functools
 
 import numpy as np
 import pandas as pd
-import statsmodels.api as sm
 
-from strategy import Strategy
-from event import SignalEvent
+from strategy import Strategy, VectorizedStrategy, IndicatorRegistry, SMA, rolling_mean, forward_fill
+from event import SignalEvent, EventType, SignalType
 from backtest import Backtest
-from data import HistoricCSVDataHandler
+from data import HistoricCSVDataHandler, format_tick_time
 from execution import SimulatedExecutionHandler
 from portfolio import Portfolio
 
@@ -40,6 +40,10 @@ class MovingAverageCrossStrategy(Strategy):
         self.events = events
         self.short_window = short_window
         self.long_window = long_window
+        # Streaming SMAs, shared with any other strategy on the same bars
+        self.indicators = IndicatorRegistry.for_bars(self.bars)
+        self.short_sma = dict((s, self.indicators.get(SMA, s, 'current', self.short_window)) for s in self.symbol_list)
+        self.long_sma = dict((s, self.indicators.get(SMA, s, 'current', self.long_window)) for s in self.symbol_list)
         # Set to True if a symbol is in the market
         self.bought = self._calculate_initial_bought()
 
@@ -63,38 +67,78 @@ class MovingAverageCrossStrategy(Strategy):
         event - A MarketEvent object.
         """
 
-        if event.type == 'MARKET':
+        if event.type is EventType.MARKET:
+            # No-op when the registry already ran for this tick on the bus
+            self.indicators.update()
             for s in self.symbol_list:
-                bars = self.bars.get_latest_bars_values(s, "current", N=self.long_window)
-                bar_date = self.bars.get_latest_bar_datetime(s)
-                if bars is not None and bars != []:
-                    short_sma = np.mean(bars[-self.short_window:])
-                    long_sma = np.mean(bars[-self.long_window:])
+                if self.long_sma[s].count > 0:
+                    short_sma = self.short_sma[s].value
+                    long_sma = self.long_sma[s].value
 
                     symbol = s
                     dt = datetime.datetime.utcnow()
                     sig_dir = ""
 
                     if short_sma > long_sma and self.bought[s] == "OUT":
-                        print("LONG: %s" % bar_date)
-                        sig_dir = 'LONG'
-                        signal = SignalEvent(1, symbol, dt, sig_dir, 1.0)
+                        print("LONG: %s" % format_tick_time(self.bars.get_latest_bar_datetime(s)))
+                        sig_dir = SignalType.LONG
+                        signal = SignalEvent(self.strategy_id, symbol, dt, sig_dir, 1.0)
                         self.events.put(signal)
                         self.bought[s] = 'LONG'
                     elif short_sma < long_sma and self.bought[s] == "LONG":
-                        print("SHORT: %s" % bar_date)
-                        sig_dir = 'EXIT'
-                        signal = SignalEvent(1, symbol, dt, sig_dir, 1.0)
+                        print("SHORT: %s" % format_tick_time(self.bars.get_latest_bar_datetime(s)))
+                        sig_dir = SignalType.EXIT
+                        signal = SignalEvent(self.strategy_id, symbol, dt, sig_dir, 1.0)
                         self.events.put(signal)
                         self.bought[s] = 'OUT'
 
 
+class MovingAverageCrossVectorized(VectorizedStrategy):
+    """
+    Vectorised MovingAverageCrossStrategy for VectorizedBacktest: the
+    same SMAs over every tick at once, with the OUT/LONG state carried
+    forward wherever the averages are equal.
+    """
+
+    def __init__(self, data, short_window=100, long_window=400):
+        """
+        Parameters:
+        data - The BarArrays of the backtest
+        short_window - The short moving average lookback.
+        long_window - The long moving average lookback.
+        """
+
+        VectorizedStrategy.__init__(self, data)
+        self.short_window = short_window
+        self.long_window = long_window
+
+    def generate_signals(self):
+        signals = np.full((len(self.data), len(self.symbol_list)), np.nan)
+        for j, s in enumerate(self.symbol_list):
+            # The SMAs only see new bars, a repeated last tick leaves them unchanged
+            updated = self.data.updated(s)
+            current = self.data.values(s, 'current')[updated]
+            last = np.cumsum(updated) - 1
+            short_sma = rolling_mean(current, self.short_window)[last]
+            long_sma = rolling_mean(current, self.long_window)[last]
+            # 1 once short > long, 0 once short < long, unchanged otherwise
+            bought = forward_fill(np.where(short_sma > long_sma, 1.0,
+                                           np.where(short_sma < long_sma, 0.0, np.nan)), 0.0)
+            change = np.diff(bought, prepend=0.0)
+            signals[change > 0, j] = SignalType.LONG
+            signals[change < 0, j] = SignalType.EXIT
+        return signals
+
+
 if __name__ == "__main__":
     csv_dir = 'D:\\tick_data\A' # CHANGE THIS!
     symbol_list = ['A1605_2016-01-04']
     initial_capital = 100000.0
-    heartbeat = 0.01
+    heartbeat = 0.0
     start_date = datetime.datetime(1990, 1, 1, 0, 0, 0)
+    # Portfolio writes no result files by default (equity.csv is gone);
+    # equity, positions, fills and stats go to results/run-<time>-<suffix>
+    portfolio = functools.partial(Portfolio, results='results')
     backtest = Backtest(csv_dir, symbol_list, initial_capital, heartbeat, start_date, HistoricCSVDataHandler,
-                        SimulatedExecutionHandler, Portfolio, MovingAverageCrossStrategy)
+                        SimulatedExecutionHandler, portfolio, MovingAverageCrossStrategy)
     backtest.simulate_trading()
\ No newline at end of file
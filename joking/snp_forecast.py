@@ -5,12 +5,13 @@
 from __future__ import print_function
 
 import datetime
+import functools
 
 import pandas as pd
 from sklearn.discriminant_analysis import QuadraticDiscriminantAnalysis
 
 from strategy import Strategy
-from event import SignalEvent
+from event import SignalEvent, EventType, SignalType
 from backtest import Backtest
 from data import HistoricCSVDataHandler
 from execution import SimulatedExecutionHandler
@@ -30,6 +31,7 @@ class SPYDailyForecastStrategy(Strategy):
         self.bars = bars
         self.symbol_list = self.bars.symbol_list
         self.events = events
+        self.bars.request_lookback(3)
         self.datetime_now = datetime.datetime.utcnow()
         self.model_start_date = datetime.datetime(2001,1,10)
         self.model_end_date = datetime.datetime(2005,12,31)
@@ -63,7 +65,7 @@ class SPYDailyForecastStrategy(Strategy):
 
         sym = self.symbol_list[0]
         dt = self.datetime_now
-        if event.type == 'MARKET':
+        if event.type is EventType.MARKET:
             self.bar_index += 1
             if self.bar_index > 5:
                 lags = self.bars.get_latest_bars_values(self.symbol_list[0], "returns", N=3)
@@ -71,11 +73,11 @@ class SPYDailyForecastStrategy(Strategy):
                 pred = self.model.predict(pred_series)
                 if pred > 0 and not self.long_market:
                     self.long_market = True
-                    signal = SignalEvent(1, sym, dt, 'LONG', 1.0)
+                    signal = SignalEvent(self.strategy_id, sym, dt, SignalType.LONG, 1.0)
                     self.events.put(signal)
                 if pred < 0 and self.long_market:
                     self.long_market = False
-                    signal = SignalEvent(1, sym, dt, 'EXIT', 1.0)
+                    signal = SignalEvent(self.strategy_id, sym, dt, SignalType.EXIT, 1.0)
                     self.events.put(signal)
 
 
@@ -85,6 +87,9 @@ if __name__ == "__main__":
     initial_capital = 100000.0
     heartbeat = 0.0
     start_date = datetime.datetime(2006,1,3)
+    # Portfolio writes no result files by default (equity.csv is gone);
+    # equity, positions, fills and stats go to results/run-<time>-<suffix>
+    portfolio = functools.partial(Portfolio, results='results')
     backtest = Backtest(csv_dir, symbol_list, initial_capital, heartbeat, start_date, HistoricCSVDataHandler,
-                        SimulatedExecutionHandler, Portfolio, SPYDailyForecastStrategy)
+                        SimulatedExecutionHandler, portfolio, SPYDailyForecastStrategy)
     backtest.simulate_trading()
\ No newline at end of file
@@ -1,2 +1,4 @@
-__all__ = ['create_sharpe_ratio', 'create_drawdowns']
-from .performance import *
\ No newline at end of file
+__all__ = ['create_sharpe_ratio', 'create_drawdowns', 'create_rolling_sharpe', 'create_performance_stats', 'OnlineMetrics', 'ResultsWriter', 'RunResults', 'load_results']
+from .performance import *
+from .online import *
+from .results import *
\ No newline at end of file
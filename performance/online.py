@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+# online.py
+
+from __future__ import print_function
+
+import math
+
+
+class OnlineMetrics(object):
+    """
+    在回测过程中逐条更新的绩效统计，每条行情的开销为O(1)，不需要保存权益曲线。
+    收益率的均值、方差用Welford算法累计，与create_sharpe_ratio一致（标准差ddof=0）；
+    权益曲线为收益率的累乘，高水位从0开始，与create_drawdowns一致。
+    实盘运行时可随时读取各项统计
+    """
+
+    def __init__(self, initial_value, periods=252*5.75*60*60):
+        """
+        初始化
+        Parameters:
+        initial_value - 初始市值，即第一个收益率的基数
+        periods - 计算夏普比率时的年化期数，见create_sharpe_ratio
+        """
+        self.periods = periods
+        self.last_value = initial_value
+        # 收益率的个数、均值和离差平方和
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 权益曲线、高水位、当前回撤及其持续期数
+        self.equity = 1.0
+        self.hwm = 0.0
+        self.drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.duration = 0
+        self.max_duration = 0
+        # 成交次数、平仓次数（头寸回到0）
+        self.trades = 0
+        self.round_trips = 0
+
+    def update(self, value):
+        """
+        读入最新市值，更新收益率统计与回撤。收益率为NaN时（品种尚无行情）跳过
+        """
+
+        r = value / self.last_value - 1.0
+        self.last_value = value
+        if r != r:
+            return
+
+        self.n += 1
+        delta = r - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (r - self.mean)
+
+        self.equity *= 1.0 + r
+        if self.equity > self.hwm:
+            self.hwm = self.equity
+        self.drawdown = self.hwm - self.equity
+        if self.drawdown > self.max_drawdown:
+            self.max_drawdown = self.drawdown
+        if self.drawdown == 0:
+            self.duration = 0
+        else:
+            self.duration += 1
+            if self.duration > self.max_duration:
+                self.max_duration = self.duration
+
+    def update_trade(self, position_before, position_after):
+        """
+        记录一次成交
+        Parameters:
+        position_before, position_after - 成交前后该品种的头寸
+        """
+
+        self.trades += 1
+        if position_after == 0 and position_before != 0:
+            self.round_trips += 1
+
+    @property
+    def variance(self):
+        return self.m2 / self.n if self.n else float('nan')
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def sharpe_ratio(self):
+        std = self.std
+        if std == 0:
+            return float('nan')
+        return math.sqrt(self.periods) * self.mean / std
+
+    @property
+    def total_return(self):
+        return self.equity - 1.0
+
+    def summary(self):
+        """
+        返回与Portfolio.output_summary_stats格式相同的统计。成交次数和平仓次数见self.trades、self.round_trips
+        """
+
+        return [("Total Return", "%0.2f%%" % (self.total_return * 100.0)),
+                ("Sharpe Ratio", "%0.2f" % self.sharpe_ratio),
+                ("Max Drawdown", "%0.2f%%" % (self.max_drawdown * 100.0)),
+                ("Drawdown Duration", "%d" % self.max_duration)]
+
+
+if __name__ == '__main__':
+    from performance import create_sharpe_ratio, create_drawdowns
+    import pandas as pd
+
+    equity = [100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 109, 108, 109, 105]
+    metrics = OnlineMetrics(equity[0], periods=len(equity))
+    for value in equity[1:]:
+        metrics.update(value)
+    series = pd.Series(data=equity, dtype='float64')
+    returns = series.pct_change()
+    drawdown, max_drawdown, max_duration = create_drawdowns((1.0 + returns).cumprod())
+    print(metrics.sharpe_ratio, create_sharpe_ratio(returns, periods=len(equity)))
+    print(metrics.max_drawdown, max_drawdown, metrics.max_duration, max_duration)
@@ -8,41 +8,178 @@ import numpy as np
 import pandas as pd
 
 
-def create_sharpe_ratio(returns, periods=252*5.75*60*60):
+def _returns_array(returns):
+    """
+    将收益率转换为float64数组，并去掉NaN（如pct_change的第一个收益率）
+    """
+
+    returns = np.asarray(returns, dtype=np.float64)
+    return returns[~np.isnan(returns)]
+
+
+def create_sharpe_ratio(returns, periods=252*5.75*60*60, n=None):
     """
     以0为基准，计算夏普比率
     returns - 收益率，pandas Series
     periods - Daily (252), Hourly (252*5.75), Minutely(252*5.75*60), Secondly(252*5.75*60*60) etc.
+    n - 收益率对应的总期数。只记录了部分期的收益率时（如只在市值变化时记录），其余期的收益率按0计入均值和标准差
+    """
+
+    if n is None:
+        return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
+    returns = _returns_array(returns)
+    mean = returns.sum() / n
+    std = np.sqrt((((returns - mean) ** 2).sum() + (n - len(returns)) * mean ** 2) / n)
+    return np.sqrt(periods) * mean / std
+
+
+def _drawdown_durations(drawdown, steps=None):
+    """
+    按游程计算回撤持续期数：回撤为0时归零，否则累加该行的期数。第一次归零之前为NaN
     """
 
-    return np.sqrt(periods) * (np.mean(returns)) / np.std(returns)
+    weights = np.ones(len(drawdown)) if steps is None else np.asarray(steps, dtype=np.float64)
+    reset = drawdown == 0
+    total = np.cumsum(np.where(reset, 0.0, weights))
+    # 每一行之前（含）最近一次归零时的累计期数
+    base = np.maximum.accumulate(np.where(reset, total, 0.0))
+    duration = total - base
+    first = np.argmax(reset) if reset.any() else len(drawdown)
+    duration[:first] = np.nan
+    return duration
 
 
-def create_drawdowns(pnl):
+def create_drawdowns(pnl, steps=None):
     """
-    计算回撤
+    计算回撤，以NumPy向量运算实现：高水位为np.fmax.accumulate，回撤时间按游程累计
     Parameters:
     pnl - 收益率A pandas Series
+    steps - 每一行代表的期数，即该行数值持续到下一行之前的期数，默认每行1期。回撤时间按期数累计
     Returns - 回撤，最大回撤， 最长回撤时间
     """
 
-    # High Water Mark
-    hwm = [0]
-    # 回撤与回撤实现，series
-    idx = pnl.index
-    drawdown = pd.Series(index=idx)
-    duration = pd.Series(index=idx)
-    # 循环更新高水位并计算回撤与回撤时间
-    for t in range(1, len(idx)):
-        hwm.append(max(hwm[t-1], pnl.iloc[t]))
-        drawdown.iloc[t] = (hwm[t]-pnl.iloc[t])
-        duration.iloc[t] = (0 if drawdown.iloc[t] == 0 else duration.iloc[t-1]+1)
-    return drawdown, drawdown.max(), duration.max()
+    values = np.asarray(pnl, dtype=np.float64)
+    # High Water Mark，从0开始，第一行不参与；NaN不更新高水位
+    hwm = np.fmax.accumulate(np.concatenate(([0.0], values[1:])))
+    drawdown = hwm - values
+    drawdown[:1] = np.nan
+    duration = _drawdown_durations(drawdown, steps)
+    drawdown = pd.Series(drawdown, index=getattr(pnl, 'index', None))
+    return drawdown, drawdown.max(), np.nanmax(duration) if np.any(duration == duration) else np.nan
+
+
+def create_rolling_sharpe(returns, window, periods=252*5.75*60*60):
+    """
+    计算滚动夏普比率，以累计和计算每个窗口的均值、标准差（ddof=0），前window-1期为NaN
+    Parameters:
+    returns - 收益率，NaN按0计
+    window - 窗口期数
+    periods - 年化期数，见create_sharpe_ratio
+    """
+
+    returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+    sharpe = np.full(len(returns), np.nan)
+    if len(returns) < window:
+        return sharpe
+    s1 = np.concatenate(([0.0], np.cumsum(returns)))
+    s2 = np.concatenate(([0.0], np.cumsum(returns * returns)))
+    mean = (s1[window:] - s1[:-window]) / window
+    var = np.maximum((s2[window:] - s2[:-window]) / window - mean * mean, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe[window - 1:] = np.sqrt(periods) * mean / np.sqrt(var)
+    return sharpe
+
+
+def create_performance_stats(returns, periods=252*5.75*60*60, window=None):
+    """
+    一次遍历收益率数组，计算全部绩效指标。权益曲线为收益率的累乘，回撤与create_drawdowns一致
+    Parameters:
+    returns - 收益率，pandas Series或数组，NaN被忽略
+    periods - 年化期数，见create_sharpe_ratio
+    window - 不为None时另外计算该窗口的滚动夏普比率
+    Returns - dict:
+        total_return - 累计收益率
+        sharpe - 夏普比率
+        sortino - 索提诺比率，下行标准差为min(r, 0)的均方根
+        calmar - 卡玛比率，年化收益率（均值 * periods）/ 最大回撤
+        max_drawdown, max_duration - 最大回撤及最长回撤期数
+        ulcer_index - 溃疡指数，相对高水位回撤比例的均方根
+        skew, kurtosis - 收益率的偏度和超额峰度（总体矩）
+        rolling_sharpe - 滚动夏普比率，仅当window不为None
+    """
+
+    r = _returns_array(returns)
+    n = len(r)
+    stats = {}
+    if n == 0:
+        return stats
+
+    # 各阶矩
+    mean = r.sum() / n
+    dev = r - mean
+    dev2 = dev * dev
+    m2 = dev2.sum() / n
+    m3 = (dev2 * dev).sum() / n
+    m4 = (dev2 * dev2).sum() / n
+    downside = np.minimum(r, 0.0)
+    downside_dev = np.sqrt((downside * downside).sum() / n)
+
+    # 权益曲线与回撤
+    equity = np.cumprod(1.0 + r)
+    hwm = np.maximum.accumulate(equity)
+    drawdown = hwm - equity
+    max_drawdown = drawdown.max()
+    relative = drawdown / hwm
+
+    sqrt_periods = np.sqrt(periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['total_return'] = equity[-1] - 1.0
+        stats['sharpe'] = sqrt_periods * mean / np.sqrt(m2)
+        stats['sortino'] = sqrt_periods * mean / downside_dev
+        stats['calmar'] = mean * periods / max_drawdown
+        stats['max_drawdown'] = max_drawdown
+        stats['max_duration'] = np.nanmax(_drawdown_durations(drawdown))
+        stats['ulcer_index'] = np.sqrt((relative * relative).sum() / n)
+        stats['skew'] = m3 / m2 ** 1.5
+        stats['kurtosis'] = m4 / (m2 * m2) - 3.0
+    if window is not None:
+        stats['rolling_sharpe'] = create_rolling_sharpe(r, window, periods)
+    return stats
 
 
 if __name__ == '__main__':
+    import time
+
     equity = [100, 101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 109, 108, 109, 105]
     series = pd.Series(data=equity, dtype='float64')
     drawdown, max_drawdown, max_duration = create_drawdowns(series)
     print(drawdown, max_drawdown, max_duration)
-    print(create_sharpe_ratio(equity, periods=len(equity)))
\ No newline at end of file
+    print(create_sharpe_ratio(equity, periods=len(equity)))
+    print(create_performance_stats(series.pct_change(), periods=len(equity), window=5))
+
+    def create_drawdowns_loop(pnl):
+        # 原来的逐行循环实现，用于对比
+        hwm = [0]
+        idx = pnl.index
+        drawdown = pd.Series(index=idx)
+        duration = pd.Series(index=idx)
+        for t in range(1, len(idx)):
+            hwm.append(max(hwm[t-1], pnl.iloc[t]))
+            drawdown.iloc[t] = (hwm[t]-pnl.iloc[t])
+            duration.iloc[t] = (0 if drawdown.iloc[t] == 0 else duration.iloc[t-1]+1)
+        return drawdown, drawdown.max(), duration.max()
+
+    rng = np.random.default_rng(0)
+    for n in (1000, 20000):
+        returns = pd.Series(np.concatenate(([np.nan], rng.normal(0, 1e-4, n - 1))))
+        pnl = (1.0 + returns).cumprod()
+        t0 = time.time()
+        old = create_drawdowns_loop(pnl)
+        t1 = time.time()
+        new = create_drawdowns(pnl)
+        t2 = time.time()
+        create_performance_stats(returns, window=1000)
+        t3 = time.time()
+        assert np.allclose(old[0], new[0], equal_nan=True) and old[1] == new[1] and old[2] == new[2]
+        print("n=%d loop %.3fs, vectorized %.5fs (%.0fx), all stats %.5fs"
+              % (n, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1), t3 - t2))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# results.py
+
+from __future__ import print_function
+
+import json
+import os, os.path
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+def frame_to_table(frame):
+    """
+    将DataFrame转换为{列名: 数组}，索引作为第一列（列名取索引名，默认为datetime）
+    """
+
+    columns = {frame.index.name or 'datetime': frame.index.to_numpy()}
+    for col in frame.columns:
+        columns[str(col)] = frame[col].to_numpy()
+    return columns
+
+
+class ResultsWriter(object):
+    """
+    将一次回测的权益曲线、成交记录和统计结果写入独立的输出文件夹，替代equity.csv。
+    表格为压缩的列式二进制格式：安装了pyarrow时为Parquet，否则为.npz；统计结果为stats.json。
+    append可在回测过程中按块写入，Parquet每块为一个row group，.npz每块为一个文件
+    """
+
+    def __init__(self, output_dir='results', run_name=None, format=None, chunk_rows=None):
+        """
+        初始化，输出文件夹在第一次写入时创建
+        Parameters:
+        output_dir - 存放各次回测结果的文件夹
+        run_name - 本次回测的子文件夹名，默认为'run-<时间>-<随机后缀>'，参数扫描时各次回测不会互相覆盖
+        format - 'parquet'或'npz'，默认有pyarrow时为'parquet'
+        chunk_rows - 不为None时，Portfolio在回测过程中每记录chunk_rows条就写入一块并清空内存中的历史
+        """
+        if format is None:
+            format = 'parquet' if pa is not None else 'npz'
+        if format not in ('parquet', 'npz'):
+            raise ValueError("Unknown results format: %s" % format)
+        if format == 'parquet' and pa is None:
+            raise ImportError("pyarrow is required to write parquet results")
+        self.output_dir = output_dir
+        self.run_name = run_name
+        self.format = format
+        self.chunk_rows = chunk_rows
+        self.run_dir = None
+        # 按块写入时各表的ParquetWriter或.npz块数
+        self._writers = {}
+        self._parts = {}
+
+    def _ensure_dir(self):
+        if self.run_dir is None:
+            if not os.path.isdir(self.output_dir):
+                os.makedirs(self.output_dir)
+            if self.run_name is None:
+                self.run_dir = tempfile.mkdtemp(prefix='run-%s-' % time.strftime('%Y%m%d-%H%M%S'),
+                                                dir=self.output_dir)
+            else:
+                self.run_dir = os.path.join(self.output_dir, self.run_name)
+                if not os.path.isdir(self.run_dir):
+                    os.makedirs(self.run_dir)
+        return self.run_dir
+
+    def write(self, name, columns):
+        """
+        一次性写入一张表
+        Parameters:
+        name - 表名，如'equity'、'fills'
+        columns - {列名: 数组}或DataFrame
+        """
+
+        if isinstance(columns, pd.DataFrame):
+            columns = frame_to_table(columns)
+        path = os.path.join(self._ensure_dir(), name)
+        if self.format == 'parquet':
+            pq.write_table(pa.table(columns), path + '.parquet', compression='zstd')
+        else:
+            np.savez_compressed(path + '.npz', **columns)
+
+    def append(self, name, columns):
+        """
+        向表追加一块数据，各块的列必须一致。写完后调用close
+        """
+
+        if isinstance(columns, pd.DataFrame):
+            columns = frame_to_table(columns)
+        run_dir = self._ensure_dir()
+        if self.format == 'parquet':
+            table = pa.table(columns)
+            writer = self._writers.get(name)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(run_dir, name + '.parquet'), table.schema, compression='zstd')
+                self._writers[name] = writer
+            writer.write_table(table)
+        else:
+            part = self._parts.get(name, 0)
+            part_dir = os.path.join(run_dir, name)
+            if part == 0 and not os.path.isdir(part_dir):
+                os.makedirs(part_dir)
+            np.savez_compressed(os.path.join(part_dir, 'part-%05d.npz' % part), **columns)
+            self._parts[name] = part + 1
+
+    def write_stats(self, stats):
+        """
+        写入统计结果
+        Parameters:
+        stats - [(名称, 值)]，见Portfolio.output_summary_stats，或dict
+        """
+
+        with open(os.path.join(self._ensure_dir(), 'stats.json'), 'w') as f:
+            json.dump(dict(stats), f, indent=1, default=float)
+
+    def close(self):
+        """
+        关闭按块写入的文件
+        """
+
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+class RunResults(object):
+    """
+    延迟读取一次回测的结果文件夹，只有访问到的表和列才会被读入内存
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self._stats = None
+
+    def names(self):
+        """
+        返回结果中的全部表名
+        """
+
+        names = set()
+        for entry in os.listdir(self.run_dir):
+            base, ext = os.path.splitext(entry)
+            if ext in ('.parquet', '.npz'):
+                names.add(base)
+            elif os.path.isdir(os.path.join(self.run_dir, entry)):
+                names.add(entry)
+        return sorted(names)
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            with open(os.path.join(self.run_dir, 'stats.json')) as f:
+                self._stats = json.load(f)
+        return self._stats
+
+    def _npz_paths(self, name):
+        path = os.path.join(self.run_dir, name)
+        if os.path.isdir(path):
+            return [os.path.join(path, p) for p in sorted(os.listdir(path)) if p.endswith('.npz')]
+        return [path + '.npz']
+
+    def columns(self, name):
+        """
+        返回表的列名，不读取数据；按块写入的表还没有任何一块时返回空列表
+        """
+
+        path = os.path.join(self.run_dir, name + '.parquet')
+        if os.path.exists(path):
+            return pq.read_schema(path).names
+        paths = self._npz_paths(name)
+        if not paths:
+            return []
+        with np.load(paths[0]) as npz:
+            return list(npz.files)
+
+    def load(self, name, columns=None):
+        """
+        读取一张表为DataFrame，有datetime列时作为索引。
+        按块写入的表还没有任何一块时（如回测在第一次写入之前停止）返回空的DataFrame
+        Parameters:
+        name - 表名
+        columns - 只读取这些列，默认全部
+        """
+
+        path = os.path.join(self.run_dir, name + '.parquet')
+        if os.path.exists(path):
+            if pa is None:
+                raise ImportError("pyarrow is required to read parquet results")
+            if columns is not None and 'datetime' in pq.read_schema(path).names and 'datetime' not in columns:
+                columns = ['datetime'] + list(columns)
+            frame = pq.read_table(path, columns=columns).to_pandas()
+        else:
+            parts = []
+            for part in self._npz_paths(name):
+                with np.load(part) as npz:
+                    keys = npz.files if columns is None else [c for c in npz.files if c in columns or c == 'datetime']
+                    parts.append(dict((k, npz[k]) for k in keys))
+            if not parts:
+                return pd.DataFrame(columns=list(columns) if columns is not None else [])
+            frame = pd.DataFrame(dict((k, np.concatenate([p[k] for p in parts])) for k in parts[0]))
+        if 'datetime' in frame.columns:
+            frame.set_index('datetime', inplace=True)
+        return frame
+
+    def __getattr__(self, name):
+        """
+        results.equity、results.fills等同于load('equity')、load('fills')
+        """
+
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.load(name)
+        except (IOError, OSError):
+            raise AttributeError(name)
+
+
+def load_results(run_dir):
+    """
+    打开一次回测的结果文件夹，见RunResults
+    """
+
+    return RunResults(run_dir)
+
+
+if __name__ == '__main__':
+    writer = ResultsWriter('D:\\tick_data\\results', format='npz')
+    for i in range(3):
+        writer.append('equity', {'datetime': np.arange(i * 5, i * 5 + 5), 'total': np.linspace(1, 2, 5)})
+    writer.write('fills', {'datetime': np.arange(2), 'symbol': np.array(['A2001', 'A2001']),
+                           'quantity': np.array([10, 10])})
+    writer.write_stats([("Total Return", "0.15%")])
+    writer.close()
+    results = load_results(writer.run_dir)
+    print(results.names(), results.stats)
+    print(results.equity.tail())
+    print(results.load('fills', columns=['symbol']))
@@ -1,2 +1,3 @@
-__all__ = ['Portfolio']
-from .portfolio import *
\ No newline at end of file
+__all__ = ['Portfolio', 'History']
+from .portfolio import *
+from .history import *
\ No newline at end of file
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+# history.py
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+
+class History(object):
+    """
+    按时间追加的定长记录（如每个品种的头寸、市值及cash、commission、total），预分配NumPy数组，
+    容量不足时翻倍扩容，追加的均摊开销为O(1)。
+    数值存放在一个二维数组中（每行一条记录，每列一个字段），datetime单独存为int64纳秒数组，
+    因此既可以零拷贝地视为结构化数组（records），也可以零拷贝地构造DataFrame（frame）
+    """
+
+    def __init__(self, fields, dtype=np.float64, capacity=1024):
+        """
+        初始化
+        Parameters:
+        fields - 字段名列表
+        dtype - 所有字段共用的数据类型
+        capacity - 初始容量（记录条数）
+        """
+        self.fields = list(fields)
+        self.dtype = np.dtype(dtype)
+        self.datetime = np.empty(max(int(capacity), 1), dtype=np.int64)
+        self.values = np.empty((len(self.datetime), len(self.fields)), dtype=self.dtype)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def capacity(self):
+        return len(self.datetime)
+
+    def _grow(self):
+        """
+        容量翻倍，复制已有记录
+        """
+
+        capacity = self.capacity * 2
+        datetime = np.empty(capacity, dtype=np.int64)
+        values = np.empty((capacity, len(self.fields)), dtype=self.dtype)
+        datetime[:self.n] = self.datetime[:self.n]
+        values[:self.n] = self.values[:self.n]
+        self.datetime = datetime
+        self.values = values
+
+    def append(self, datetime, row):
+        """
+        追加一条记录
+        Parameters:
+        datetime - int64纳秒时间
+        row - 按fields排列的数值序列
+        """
+
+        if self.n == self.capacity:
+            self._grow()
+        self.datetime[self.n] = datetime
+        self.values[self.n] = row
+        self.n += 1
+
+    def clear(self):
+        """
+        清空记录，保留已分配的容量
+        """
+
+        self.n = 0
+
+    def last(self):
+        """
+        返回最后一条记录的数值行（视图）
+        """
+
+        return self.values[self.n - 1]
+
+    def records(self):
+        """
+        返回已记录数据的结构化数组视图，字段为fields，不复制数据
+        """
+
+        block = self.values[:self.n]
+        return block.view(np.dtype([(f, self.dtype) for f in self.fields])).reshape(self.n)
+
+    def frame(self):
+        """
+        返回以datetime为索引、fields为列的DataFrame，数值列直接引用内部数组，不复制数据
+        """
+
+        index = pd.Index(self.datetime[:self.n], name='datetime')
+        return pd.DataFrame(self.values[:self.n], index=index, columns=self.fields, copy=False)
+
+
+if __name__ == '__main__':
+    history = History(['A2001', 'cash', 'commission', 'total'], capacity=2)
+    for t in range(5):
+        history.append(t, [t * 10.0, 100000.0 - t, 1.5 * t, 100000.0 + t])
+    print(history.capacity, len(history))
+    print(history.records()['total'])
+    print(history.frame())
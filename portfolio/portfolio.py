@@ -6,6 +6,7 @@ from __future__ import print_function
 
 import datetime
 from math import floor
+import numbers
 try:
     import Queue as queue
 except ImportError:
@@ -13,54 +14,111 @@ except ImportError:
 import numpy as np
 import pandas as pd
 
-from event import FillEvent, OrderEvent, MarketEvent, SignalEvent
-from performance import create_sharpe_ratio, create_drawdowns
-from data import HistoricCSVDataHandler
+from event import FillEvent, OrderEvent, MarketEvent, SignalEvent, EventType, SignalType, Direction, OrderType
+from performance import create_sharpe_ratio, create_drawdowns, OnlineMetrics, ResultsWriter
+from data import HistoricCSVDataHandler, NANOS_PER_SECOND, parse_tick_time
+from .history import History
 
 
 class Portfolio(object):
     """
     在获取新行情数据后，处理头寸和市值positions ，holdings
     """
-    def __init__(self, bars, events, start_date, initial_capital=100000.0):
+    # 每个交易日的交易秒数，按每秒一条行情计算夏普比率
+    PERIODS = 5.75*60*60
+
+    def __init__(self, bars, events, start_date, initial_capital=100000.0, record='tick', interval=1.0,
+                 results=None, strategy_id=None):
         """
-        初始化，设置初始资金
+        初始化，设置初始资金。记录方式通过functools.partial(Portfolio, record='interval', interval=60)传给Backtest
         Parameters:
         bars - DataHandler对象
         events - queue.Qeue()
         start_date - 开始日期，日内交易要写开始时间
         initial_capital - 初始资金
+        record - 头寸和市值的记录方式：
+                 'tick'，每条行情记录一次；
+                 'change'，只在头寸或市值变化时记录，未记录的行情与上一条记录相同；
+                 'interval'，按行情时间每interval秒记录一次，取该区间最后一条行情时的头寸和市值；
+                 'none'，不记录，统计结果只来自self.metrics
+        interval - record='interval'时的采样周期，秒
+        results - 结果输出：文件夹路径（每次回测写入其中新建的子文件夹），或ResultsWriter。
+                  默认None，不写任何结果文件（原来每次回测都写的equity.csv已取消），需要时传入如results='results'。
+                  ResultsWriter的chunk_rows不为None时，回测过程中按块写入历史，统计结果来自self.metrics
+        strategy_id - 子账户对应的strategy编号，只处理该策略的信号和成交；None时处理全部信号和成交
         """
+        if record not in ('tick', 'change', 'interval', 'none'):
+            raise ValueError("Unknown record policy: %s" % record)
         self.bars = bars
+        # 只需要最新一条行情计算市值
+        self.bars.request_lookback(1)
         self.events = events
         self.symbol_list = self.bars.symbol_list
         self.start_date = start_date
         self.initial_capital = initial_capital
+        self.strategy_id = strategy_id
+        # 历史记录的时间为int64纳秒，与DataHandler一致
+        self.start_time = self._start_time(start_date)
         self.all_positions = self.construct_all_positions()
         self.current_positions = dict( (k,v) for k, v in [(s, 0) for s in self.symbol_list] )
+        # 头寸与最新价格的向量，按symbol_list排列，与current_positions同步更新
+        self.symbol_index = dict((s, i) for i, s in enumerate(self.symbol_list))
+        self.positions = np.zeros(len(self.symbol_list), dtype=np.int64)
+        self.prices = np.full(len(self.symbol_list), np.nan)
         self.all_holdings = self.construct_all_holdings()
         self.current_holdings = self.construct_current_holdings()
 
+        self.record = record
+        self.interval = int(interval * NANOS_PER_SECOND)
+        # 已处理的行情条数
+        self.tick_count = 0
+        # record='change'时，每条记录对应的行情序号，以及上一条记录的头寸和市值
+        self.record_ticks = [0]
+        self.last_record = None
+        # record='interval'时，当前区间尚未写入的最后一条记录
+        self.pending = None
+        self.pending_bucket = None
+        # 逐条行情更新的绩效统计，与记录方式无关
+        self.metrics = OnlineMetrics(self.initial_capital, periods=self.PERIODS)
+        # 成交记录，每条为(datetime, symbol, direction, quantity, price, commission)
+        self.fills = []
+
+        if isinstance(results, str):
+            results = ResultsWriter(results)
+        self.results = results
+        # 按块写入时，每块的记录条数及上一块最后的total、equity_curve
+        self.stream_rows = results.chunk_rows if results is not None else None
+        self.last_total = np.nan
+        self.last_equity = 1.0
+
+    @staticmethod
+    def _start_time(start_date):
+        """
+        将start_date转换为int64纳秒，整数原样使用，datetime及时间字符串按parse_tick_time解析
+        """
+
+        if isinstance(start_date, numbers.Integral):
+            return int(start_date)
+        return int(parse_tick_time([start_date])[0])
+
     def construct_all_positions(self):
         """
-        根据品种列表创建头寸字典
+        根据品种列表创建头寸历史，每个品种一列
         """
 
-        d = dict((k, v) for k, v in [(s, 0) for s in self.symbol_list])
-        d['datetime'] = self.start_date
-        return [d]
+        history = History(self.symbol_list, dtype=np.int64)
+        history.append(self.start_time, [0] * len(self.symbol_list))
+        return history
 
     def construct_all_holdings(self):
         """
-        根据品种列表创建市值字典
+        根据品种列表创建市值历史，每个品种一列，另有cash、commission、total
         """
 
-        d = dict((k, v) for k, v in [(s, 0.0) for s in self.symbol_list])
-        d['datetime'] = self.start_date
-        d['cash'] = self.initial_capital
-        d['commission'] = 0.0
-        d['total'] = self.initial_capital
-        return [d]
+        history = History(self.symbol_list + ['cash', 'commission', 'total'])
+        history.append(self.start_time, [0.0] * len(self.symbol_list) +
+                       [self.initial_capital, 0.0, self.initial_capital])
+        return history
 
     def construct_current_holdings(self):
         """
@@ -75,32 +133,100 @@ class Portfolio(object):
 
     def update_timeindex(self, event):
         """
-        根据最新接收到的行情信息，计算当前瞬时头寸和市值，并更新到字典中
+        根据最新接收到的行情信息，计算当前瞬时头寸和市值，按记录方式存入历史
         """
 
         latest_datetime = self.bars.get_latest_bar_datetime(self.symbol_list[0])
+        self.tick_count += 1
+
+        # 更新市值，所有品种一次向量运算
+        n = len(self.symbol_list)
+        positions = self.positions
+        self.prices = self.bars.get_latest_values("current")
+        row = np.empty(n + 3)
+        np.multiply(positions, self.prices, out=row[:n])
+        cash = self.current_holdings['cash']
+        total = cash + row[:n].sum()
+        row[n] = cash
+        row[n + 1] = self.current_holdings['commission']
+        row[n + 2] = total
+        self.metrics.update(total)
+
+        if self.record == 'tick':
+            self._record(latest_datetime, positions, row)
+        elif self.record == 'change':
+            # 含NaN（品种尚无行情）的记录不相等，总会写入
+            if self.last_record is None or not (np.array_equal(row, self.last_record[1])
+                                                and np.array_equal(positions, self.last_record[0])):
+                self._record(latest_datetime, positions, row)
+                self.record_ticks.append(self.tick_count)
+                self.last_record = (positions.copy(), row)
+        elif self.record == 'interval':
+            bucket = latest_datetime // self.interval
+            if bucket != self.pending_bucket:
+                self._flush_pending()
+            self.pending = (latest_datetime, positions.copy(), row)
+            self.pending_bucket = bucket
+
+    def exposure(self):
+        """
+        按最新价格计算的总敞口，即各品种头寸市值绝对值之和
+        """
 
-        # 更新头寸
-        dp = dict((k, v) for k, v in [(s, 0) for s in self.symbol_list])
-        dp['datetime'] = latest_datetime
-        for s in self.symbol_list:
-            dp[s] = self.current_positions[s]
-        # 存入字典
-        self.all_positions.append(dp)
+        return np.abs(self.positions).dot(np.nan_to_num(self.prices))
 
-        # 更新市值
-        dh = dict((k, v) for k, v in [(s, 0) for s in self.symbol_list])
-        dh['datetime'] = latest_datetime
-        dh['cash'] = self.current_holdings['cash']
-        dh['commission'] = self.current_holdings['commission']
-        dh['total'] = self.current_holdings['cash']
-        for s in self.symbol_list:
-            # 模拟实时
-            market_value = self.current_positions[s] * self.bars.get_latest_bar_value(s, "current")
-            dh[s] = market_value
-            dh['total'] += market_value
-        # 存入字典
-        self.all_holdings.append(dh)
+    def _flush_pending(self):
+        """
+        record='interval'时，写入上一区间最后一条行情时的头寸和市值
+        """
+
+        if self.pending is not None:
+            self._record(*self.pending)
+            self.pending = None
+
+    def _record(self, latest_datetime, positions, row):
+        """
+        存入一条头寸和市值记录，按块写入时满一块即写出
+        """
+
+        self.all_positions.append(latest_datetime, positions)
+        self.all_holdings.append(latest_datetime, row)
+        if self.stream_rows is not None and len(self.all_holdings) >= self.stream_rows:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        """
+        将内存中的头寸和市值历史作为一块写入结果文件，并清空历史。
+        returns、equity_curve接续上一块计算，与create_equity_curve_dataframe一致；不含drawdown列
+        """
+
+        if len(self.all_holdings) == 0:
+            return
+        curve = self.all_holdings.frame()
+        total = curve['total'].to_numpy()
+        returns = total / np.append(self.last_total, total[:-1]) - 1.0
+        missing = np.isnan(returns)
+        equity = self.last_equity * np.cumprod(np.where(missing, 1.0, 1.0 + returns))
+        self.last_total = total[-1]
+        self.last_equity = equity[-1]
+        equity[missing] = np.nan
+        curve['returns'] = returns
+        curve['equity_curve'] = equity
+        self.results.append('equity', curve)
+        self.results.append('positions', self.all_positions.frame())
+        # 只保留最后一块，供回测结束时查看
+        self.equity_curve = curve.copy()
+        self.all_positions.clear()
+        self.all_holdings.clear()
+
+    def subscribe(self, events):
+        """
+        在事件总线上注册处理函数：MarketEvent更新市值，SignalEvent生成订单，FillEvent更新头寸
+        """
+
+        events.subscribe(MarketEvent, self.update_timeindex)
+        events.subscribe(SignalEvent, self.update_signal)
+        events.subscribe(FillEvent, self.update_fill)
 
     def update_positions_from_fill(self, fill):
         """
@@ -109,14 +235,13 @@ class Portfolio(object):
         fill - Fill对象
         """
 
-        # 判断fill方向
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
+        # 判断fill方向，Direction的值即为头寸变化的符号
+        fill_dir = int(fill.direction)
         # 更新头寸
+        position = self.current_positions[fill.symbol]
         self.current_positions[fill.symbol] += fill_dir * fill.quantity
+        self.positions[self.symbol_index[fill.symbol]] = self.current_positions[fill.symbol]
+        self.metrics.update_trade(position, self.current_positions[fill.symbol])
 
     def update_holdings_from_fill(self, fill):
         """
@@ -125,15 +250,13 @@ class Portfolio(object):
         fill - Fill对象
         """
 
-        # 判断fill方向
-        fill_dir = 0
-        if fill.direction == 'BUY':
-            fill_dir = 1
-        if fill.direction == 'SELL':
-            fill_dir = -1
+        # 判断fill方向，Direction的值即为头寸变化的符号
+        fill_dir = int(fill.direction)
         # 更新市值
         fill_cost = self.bars.get_latest_bar_value(fill.symbol, "current")
         cost = fill_dir * fill_cost * fill.quantity
+        self.fills.append((self.bars.get_latest_bar_datetime(fill.symbol), fill.symbol, fill_dir, fill.quantity,
+                           fill_cost, fill.commission))
         self.current_holdings[fill.symbol] += cost
         self.current_holdings['commission'] += fill.commission
         self.current_holdings['cash'] -= (cost + fill.commission)
@@ -144,7 +267,9 @@ class Portfolio(object):
         根据Fill对象，更新头寸和市值
         """
 
-        if event.type == 'FILL':
+        if event.type is EventType.FILL:
+            if self.strategy_id is not None and event.strategy_id != self.strategy_id:
+                return
             self.update_positions_from_fill(event)
             self.update_holdings_from_fill(event)
 
@@ -163,17 +288,19 @@ class Portfolio(object):
 
         mkt_quantity = 10
         cur_quantity = self.current_positions[symbol]
-        order_type = 'MKT'
+        order_type = OrderType.MKT
+
+        strategy_id = signal.strategy_id
 
-        if direction == 'LONG' and cur_quantity == 0:
-            order = OrderEvent(symbol, order_type, mkt_quantity, 'BUY')
-        if direction == 'SHORT' and cur_quantity == 0:
-            order = OrderEvent(symbol, order_type, mkt_quantity, 'SELL')
+        if direction is SignalType.LONG and cur_quantity == 0:
+            order = OrderEvent(symbol, order_type, mkt_quantity, Direction.BUY, strategy_id)
+        if direction is SignalType.SHORT and cur_quantity == 0:
+            order = OrderEvent(symbol, order_type, mkt_quantity, Direction.SELL, strategy_id)
 
-        if direction == 'EXIT' and cur_quantity > 0:
-            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'SELL')
-        if direction == 'EXIT' and cur_quantity < 0:
-            order = OrderEvent(symbol, order_type, abs(cur_quantity), 'BUY')
+        if direction is SignalType.EXIT and cur_quantity > 0:
+            order = OrderEvent(symbol, order_type, abs(cur_quantity), Direction.SELL, strategy_id)
+        if direction is SignalType.EXIT and cur_quantity < 0:
+            order = OrderEvent(symbol, order_type, abs(cur_quantity), Direction.BUY, strategy_id)
 
         return order
 
@@ -182,39 +309,79 @@ class Portfolio(object):
         根据接收到的SignalEvent生成新订单
         """
 
-        if event.type == 'SIGNAL':
+        if event.type is EventType.SIGNAL:
+            if self.strategy_id is not None and event.strategy_id != self.strategy_id:
+                return
             order_event = self.generate_naive_order(event)
             self.events.put(order_event)
 
     def create_equity_curve_dataframe(self):
         """
-        根据市值字典，计算权益曲线dataframe
+        根据市值历史，计算权益曲线dataframe，市值列直接引用历史数组
         """
 
-        curve = pd.DataFrame(self.all_holdings)
-        curve.set_index('datetime', inplace = True)
+        self._flush_pending()
+        if self.stream_rows is not None:
+            self._write_chunk()
+            return
+        curve = self.all_holdings.frame()
         curve['returns'] = curve['total'].pct_change()
         curve['equity_curve'] = (1.0 + curve['returns']).cumprod()
         self.equity_curve = curve
 
     def output_summary_stats(self):
         """
-        回测后的统计总结
+        回测后的统计总结，results不为None时并写入结果文件。record='none'或按块写入时没有完整的权益曲线，返回self.metrics的统计
         """
 
+        if self.record == 'none' or self.stream_rows is not None:
+            stats = self.metrics.summary()
+            self.write_results(stats)
+            return stats
         total_return = self.equity_curve['equity_curve'].iloc[-1]
         returns = self.equity_curve['returns']
         pnl = self.equity_curve['equity_curve']
-        sharpe_ratio = create_sharpe_ratio(returns, periods=5.75*60*60)
-        drawdown, max_dd, dd_duration = create_drawdowns(pnl)
+        if self.record == 'tick':
+            sharpe_ratio = create_sharpe_ratio(returns, periods=self.PERIODS)
+            drawdown, max_dd, dd_duration = create_drawdowns(pnl)
+        elif self.record == 'change':
+            # 未记录的行情收益率为0，回撤时间按行情条数计
+            sharpe_ratio = create_sharpe_ratio(returns, periods=self.PERIODS, n=self.tick_count)
+            steps = np.diff(np.append(self.record_ticks, self.tick_count + 1))
+            drawdown, max_dd, dd_duration = create_drawdowns(pnl, steps=steps)
+        else:
+            # 每个交易日的采样次数，回撤时间按采样次数计
+            periods = self.PERIODS * NANOS_PER_SECOND / self.interval
+            sharpe_ratio = create_sharpe_ratio(returns, periods=periods)
+            drawdown, max_dd, dd_duration = create_drawdowns(pnl)
         self.equity_curve['drawdown'] = drawdown
         stats = [("Total Return", "%0.2f%%" % ((total_return - 1.0) * 100.0)),
                  ("Sharpe Ratio", "%0.2f" % sharpe_ratio),
                  ("Max Drawdown", "%0.2f%%" % (max_dd * 100.0)),
                  ("Drawdown Duration", "%d" % dd_duration)]
-        self.equity_curve.to_csv('equity.csv')
+        self.write_results(stats)
         return stats
 
+    def write_results(self, stats):
+        """
+        将权益曲线、头寸、成交记录和统计结果写入self.results
+        """
+
+        if self.results is None:
+            return
+        if self.stream_rows is None:
+            self.results.write('equity', self.equity_curve)
+            self.results.write('positions', self.all_positions.frame())
+        fills = list(zip(*self.fills)) or [[]] * 6
+        self.results.write('fills', {'datetime': np.array(fills[0], dtype=np.int64),
+                                     'symbol': np.array(fills[1], dtype=str),
+                                     'direction': np.array(fills[2], dtype=np.int8),
+                                     'quantity': np.array(fills[3], dtype=np.float64),
+                                     'price': np.array(fills[4], dtype=np.float64),
+                                     'commission': np.array(fills[5], dtype=np.float64)})
+        self.results.write_stats(stats)
+        self.results.close()
+
 
 if __name__ == '__main__':
     data_handler = HistoricCSVDataHandler(events=queue.Queue(), csv_dir='D:\\tick_data\\test_data',
@@ -227,7 +394,7 @@ if __name__ == '__main__':
         i += 1
         data_handler.update_bars()
 
-    fill_event = FillEvent(direction='BUY', fill_cost=3, quantity=10, symbol='A2001_2019-11-05',
+    fill_event = FillEvent(direction=Direction.BUY, fill_cost=3, quantity=10, symbol='A2001_2019-11-05',
                        timeindex='09:00:01', exchange='dalian')
     portfolio.update_fill(fill_event)
     portfolio.update_timeindex(market_event)
@@ -1,2 +1,6 @@
-__all__ = ['Strategy']
+__all__ = ['Strategy', 'Indicator', 'RollingSum', 'SMA', 'EMA', 'RollingVariance', 'RollingStd', 'ZScore',
+           'RollingMax', 'RollingMin', 'VWAP', 'IndicatorRegistry', 'RollingOLS', 'EWRollingOLS', 'KalmanRegression',
+           'VectorizedStrategy', 'rolling_mean', 'forward_fill', 'rolling_ols']
 from .strategy import *
+from .indicators import *
+from .regression import *
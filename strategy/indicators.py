@@ -0,0 +1,475 @@
+# indicators.py
+
+from __future__ import print_function
+
+from collections import deque
+import inspect
+import math
+import weakref
+
+import numpy as np
+
+from event import MarketEvent
+
+
+class Indicator(object):
+    """
+    Indicator is the base class for streaming indicators. Each call
+    to update() consumes one new bar value in O(1) time and returns
+    the current value of the indicator, which is also available as
+    the value attribute. NaN inputs (a symbol without a quote yet)
+    are skipped and leave the indicator unchanged.
+    """
+
+    value = np.nan
+
+    def update(self, x):
+        raise NotImplementedError("Should implement update()")
+
+
+class _Window(object):
+    """
+    Fixed-size circular buffer of the last `window` values.
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = int(window)
+        self.buffer = [0.0] * self.window
+        self.count = 0
+        self.pos = 0
+
+    def push(self, x):
+        """
+        Stores x and returns the value it replaced, or None while the
+        window is still filling up.
+        """
+
+        old = self.buffer[self.pos] if self.count == self.window else None
+        self.buffer[self.pos] = x
+        self.pos += 1
+        if self.pos == self.window:
+            self.pos = 0
+        if self.count < self.window:
+            self.count += 1
+        return old
+
+    def values(self):
+        return self.buffer[:self.count]
+
+    def fsum(self):
+        return math.fsum(self.buffer[:self.count])
+
+    @property
+    def full(self):
+        return self.count == self.window
+
+
+class RollingSum(Indicator):
+    """
+    Sum of the last `window` values. The running sum is recomputed
+    from the buffer once every `window` updates so that rounding
+    errors cannot accumulate; the amortised cost stays O(1).
+    """
+
+    def __init__(self, window):
+        self.data = _Window(window)
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        old = self.data.push(x)
+        self.updates += 1
+        if self.updates % self.data.window == 0:
+            self.total = self.data.fsum()
+        else:
+            self.total += x if old is None else x - old
+        self.value = self.total
+        return self.value
+
+    @property
+    def count(self):
+        return self.data.count
+
+    @property
+    def ready(self):
+        return self.data.full
+
+
+class SMA(RollingSum):
+    """
+    Simple moving average of the last `window` values. Until the window
+    is full it averages the values seen so far, like np.mean over a
+    shorter get_latest_bars_values() array.
+    """
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        RollingSum.update(self, x)
+        self.value = self.total / self.data.count
+        return self.value
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average, value = alpha * x + (1 - alpha) * value,
+    seeded with the first value (pandas ewm(adjust=False)). Give either
+    span (alpha = 2 / (span + 1)) or alpha.
+    """
+
+    def __init__(self, span=None, alpha=None):
+        if alpha is None:
+            if span is None:
+                raise ValueError("Either span or alpha is required")
+            alpha = 2.0 / (span + 1.0)
+        self.alpha = alpha
+        self.count = 0
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        if self.count == 0:
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        self.count += 1
+        return self.value
+
+    @property
+    def ready(self):
+        return self.count > 0
+
+
+class RollingVariance(Indicator):
+    """
+    Variance of the last `window` values, using Welford's algorithm
+    extended to a sliding window (add the new value, remove the one
+    that leaves the window). ddof=0 matches np.var / np.std, ddof=1
+    matches pandas rolling().var(). The mean and sum of squared
+    deviations are recomputed from the buffer once per `window`
+    updates to bound rounding drift.
+    """
+
+    def __init__(self, window, ddof=0):
+        self.data = _Window(window)
+        self.ddof = ddof
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def _update_moments(self, x):
+        old = self.data.push(x)
+        self.updates += 1
+        if self.updates % self.data.window == 0:
+            self.mean = self.data.fsum() / self.data.count
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in self.data.values())
+        elif old is None:
+            delta = x - self.mean
+            self.mean += delta / self.data.count
+            self.m2 += delta * (x - self.mean)
+        else:
+            mean = self.mean + (x - old) / self.data.window
+            self.m2 += (x - old) * (x - mean + old - self.mean)
+            self.mean = mean
+        if self.m2 < 0.0:
+            self.m2 = 0.0
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        self._update_moments(x)
+        n = self.data.count - self.ddof
+        self.value = self.m2 / n if n > 0 else np.nan
+        return self.value
+
+    @property
+    def ready(self):
+        return self.data.full
+
+
+class RollingStd(RollingVariance):
+    """
+    Standard deviation of the last `window` values, see RollingVariance.
+    """
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        self.value = math.sqrt(RollingVariance.update(self, x))
+        return self.value
+
+
+class ZScore(RollingVariance):
+    """
+    Z-score of the newest value against the mean and standard deviation
+    of the last `window` values (including the newest one), i.e. the
+    last element of (s - s.mean()) / s.std() for a window s.
+    """
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        variance = RollingVariance.update(self, x)
+        std = math.sqrt(variance) if variance == variance else np.nan
+        self.value = (x - self.mean) / std if std > 0 else np.nan
+        return self.value
+
+
+class _RollingExtreme(Indicator):
+    """
+    Rolling min/max over the last `window` values with a monotonic
+    deque of (position, value): each value is pushed and popped at
+    most once, so updates are amortised O(1).
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = int(window)
+        self.count = 0
+        self.deque = deque()
+
+    def _dominates(self, new, old):
+        raise NotImplementedError
+
+    def update(self, x):
+        if x != x:
+            return self.value
+        d = self.deque
+        while d and self._dominates(x, d[-1][1]):
+            d.pop()
+        d.append((self.count, x))
+        if d[0][0] <= self.count - self.window:
+            d.popleft()
+        self.count += 1
+        self.value = d[0][1]
+        return self.value
+
+    @property
+    def ready(self):
+        return self.count >= self.window
+
+
+class RollingMax(_RollingExtreme):
+    """
+    Maximum of the last `window` values.
+    """
+
+    def _dominates(self, new, old):
+        return new >= old
+
+
+class RollingMin(_RollingExtreme):
+    """
+    Minimum of the last `window` values.
+    """
+
+    def _dominates(self, new, old):
+        return new <= old
+
+
+class VWAP(Indicator):
+    """
+    Volume weighted average price. update(price, volume) takes the
+    traded volume of the new bar; with cumulative=True the volume is
+    a running daily total (as in JoinQuant ticks) and the per-bar
+    volume is its increase. window=None averages over everything seen
+    so far, otherwise over the last `window` bars.
+    """
+
+    def __init__(self, window=None, cumulative=True):
+        self.cumulative = cumulative
+        self.last_volume = 0.0
+        if window is None:
+            self.pv = self.v = 0.0
+            self.pv_sum = self.v_sum = None
+        else:
+            self.pv_sum = RollingSum(window)
+            self.v_sum = RollingSum(window)
+
+    def update(self, price, volume):
+        if price != price or volume != volume:
+            return self.value
+        if self.cumulative:
+            # The running total restarts at the start of a new day
+            traded = volume - self.last_volume if volume >= self.last_volume else volume
+            self.last_volume = volume
+        else:
+            traded = volume
+        if self.pv_sum is None:
+            self.pv += price * traded
+            self.v += traded
+            pv, v = self.pv, self.v
+        else:
+            pv = self.pv_sum.update(price * traded)
+            v = self.v_sum.update(traded)
+        self.value = pv / v if v > 0 else price
+        return self.value
+
+
+class IndicatorRegistry(object):
+    """
+    IndicatorRegistry holds the streaming indicators of one DataHandler.
+    Strategies ask for indicators through get(); identical requests
+    (same class, symbol, fields and parameters, however the parameters
+    are passed) return the same object, so an indicator shared by
+    several strategies is computed once per tick. update() reads each
+    (symbol, fields) combination once from the DataHandler and feeds
+    all indicators built on it, and feeds every bar exactly once.
+    """
+
+    _registries = weakref.WeakKeyDictionary()
+
+    def __init__(self, bars):
+        """
+        Parameters:
+        bars - The DataHandler object that provides bar information
+        """
+
+        self.bars = bars
+        # Indicators only need the newest bar
+        self.bars.request_lookback(1)
+        self.indicators = {}
+        # [(symbol, fields, [indicator, ...])]
+        self.groups = []
+        self._group_index = {}
+        # The bar count of each (symbol, fields) group at its last update
+        self.seen = {}
+        self._buses = []
+
+    @classmethod
+    def for_bars(cls, bars):
+        """
+        Returns the registry shared by all strategies on `bars`.
+        """
+
+        registry = cls._registries.get(bars)
+        if registry is None:
+            registry = cls(bars)
+            cls._registries[bars] = registry
+        return registry
+
+    def get(self, indicator_cls, symbol, fields='current', *args, **kwargs):
+        """
+        Returns the indicator_cls(*args, **kwargs) instance updated with
+        the `fields` values of `symbol`, creating it on first request.
+        Parameters:
+        indicator_cls - An Indicator subclass, e.g. SMA
+        symbol - The symbol whose bars feed the indicator
+        fields - A bar field, or a tuple of fields passed to update()
+                 in order (e.g. ('current', 'volume') for VWAP)
+        """
+
+        if isinstance(fields, str):
+            fields = (fields,)
+        fields = tuple(fields)
+        # SMA(100) and SMA(window=100) are the same indicator
+        bound = inspect.signature(indicator_cls).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = tuple((name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+                       for name, value in bound.arguments.items())
+        key = (indicator_cls, symbol, fields, params)
+        indicator = self.indicators.get(key)
+        if indicator is None:
+            indicator = indicator_cls(*args, **kwargs)
+            self.indicators[key] = indicator
+            group = self._group_index.get((symbol, fields))
+            if group is None:
+                group = []
+                self._group_index[(symbol, fields)] = group
+                self.groups.append((symbol, fields, group))
+                self.seen[(symbol, fields)] = 0
+            group.append(indicator)
+        return indicator
+
+    def update(self, event=None):
+        """
+        Feeds the bars received since the last update to every registered
+        indicator, in order. A bar is fed only once, so update() may be
+        called any number of times per tick: from the bus, and again from
+        calculate_signals to make sure the indicators are current. The
+        MarketEvent repeated when the DataHandler runs out carries no new
+        bar and changes nothing. If several bars arrived in between, the
+        ones the DataHandler still retains are fed.
+        """
+
+        bars = self.bars
+        seen = self.seen
+        for symbol, fields, indicators in self.groups:
+            count = bars.get_bar_count(symbol)
+            new = count - seen[(symbol, fields)]
+            if new <= 0:
+                continue
+            seen[(symbol, fields)] = count
+            if new == 1:
+                rows = [[bars.get_latest_bar_value(symbol, f) for f in fields]]
+            else:
+                rows = zip(*[bars.get_latest_bars_values(symbol, f, new) for f in fields])
+            for row in rows:
+                for indicator in indicators:
+                    indicator.update(*row)
+
+    def subscribe(self, events):
+        """
+        Registers update() for MarketEvents, once per event bus. Strategies
+        call this before registering their own handler, so indicators are
+        up to date when calculate_signals runs.
+        """
+
+        if any(bus is events for bus in self._buses):
+            return
+        self._buses.append(events)
+        events.subscribe(MarketEvent, self.update)
+
+
+def rolling_mean(values, window):
+    """
+    Vectorised counterpart of SMA: the mean of the last `window`
+    values at every position of the array (of the values so far while
+    fewer than `window` are available), from one cumulative sum.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    total = np.concatenate(([0.0], np.cumsum(values)))
+    count = np.arange(1, len(values) + 1)
+    start = np.maximum(count - window, 0)
+    return (total[count] - total[start]) / np.minimum(count, window)
+
+
+def forward_fill(values, initial=np.nan):
+    """
+    Replaces each NaN with the last non-NaN value before it along the
+    first axis, or with `initial` if there is none. Used to turn
+    "set/reset/hold" conditions into the state a streaming strategy
+    carries from tick to tick.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    index = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    last = np.maximum.accumulate(np.where(np.isnan(values), -1, index), axis=0)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=0)
+    return np.where(last >= 0, filled, initial)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    prices = 100.0 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, 5000))
+    sma, std, high = SMA(400), RollingStd(400), RollingMax(400)
+    for i, p in enumerate(prices):
+        sma.update(p)
+        std.update(p)
+        high.update(p)
+    last = prices[-400:]
+    print(sma.value - last.mean(), std.value - last.std(), high.value - last.max())
+    print(rolling_mean(prices, 400)[-1] - sma.value)
+
+    for window in (10, 400, 4000):
+        t_np = timeit.timeit(lambda: np.mean(prices[-window:]), number=20000)
+        s = SMA(window)
+        t_sma = timeit.timeit(lambda: s.update(1.0), number=20000)
+        print("window %d: np.mean %.2fus, SMA.update %.2fus" % (window, t_np / 0.02, t_sma / 0.02))
@@ -0,0 +1,330 @@
+# regression.py
+
+from __future__ import print_function
+
+import math
+
+import numpy as np
+
+
+class RollingOLS(object):
+    """
+    RollingOLS regresses y on x over the last `window` observations and
+    updates the slope (hedge ratio), intercept and residual z-score in
+    O(1) per new pair of values, from windowed sufficient statistics
+    (sums of x, y, x*x, y*y and x*y) instead of refitting.
+
+    With fit_intercept=False it matches sm.OLS(y, x).fit().params[0];
+    with fit_intercept=True it matches sm.OLS(y, sm.add_constant(x)).
+    The z-score is that of the newest residual against the residuals
+    of the whole window, all computed with the current coefficients,
+    i.e. the last element of (e - e.mean()) / e.std() where
+    e = y - alpha - beta * x.
+
+    The sums are kept relative to a shift close to the window means to
+    avoid cancellation on price levels, and are recomputed exactly from
+    the buffered values once per `window` updates.
+    """
+
+    def __init__(self, window, fit_intercept=False):
+        """
+        Parameters:
+        window - The number of observations in the regression window
+        fit_intercept - Whether to fit an intercept (alpha)
+        """
+
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.window = int(window)
+        self.fit_intercept = fit_intercept
+        self.xs = [0.0] * self.window
+        self.ys = [0.0] * self.window
+        self.count = 0
+        self.pos = 0
+        self.updates = 0
+        # Shift and shifted sums
+        self.kx = self.ky = None
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+        self.beta = self.alpha = self.residual = self.zscore = np.nan
+
+    @property
+    def ready(self):
+        return self.count == self.window
+
+    def _add(self, x, y, sign):
+        x -= self.kx
+        y -= self.ky
+        self.sx += sign * x
+        self.sy += sign * y
+        self.sxx += sign * x * x
+        self.syy += sign * y * y
+        self.sxy += sign * x * y
+
+    def _resync(self):
+        """
+        Recomputes the sums exactly, re-centred on the current window means.
+        """
+
+        xs = self.xs[:self.count]
+        ys = self.ys[:self.count]
+        self.kx = math.fsum(xs) / self.count
+        self.ky = math.fsum(ys) / self.count
+        dx = [x - self.kx for x in xs]
+        dy = [y - self.ky for y in ys]
+        self.sx = math.fsum(dx)
+        self.sy = math.fsum(dy)
+        self.sxx = math.fsum(a * a for a in dx)
+        self.syy = math.fsum(b * b for b in dy)
+        self.sxy = math.fsum(a * b for a, b in zip(dx, dy))
+
+    def update(self, x, y):
+        """
+        Adds a new observation and refits. Returns the z-score of its residual.
+        """
+
+        if x != x or y != y:
+            return self.zscore
+        if self.kx is None:
+            self.kx, self.ky = x, y
+        if self.count == self.window:
+            self._add(self.xs[self.pos], self.ys[self.pos], -1.0)
+        else:
+            self.count += 1
+        self.xs[self.pos] = x
+        self.ys[self.pos] = y
+        self.pos = (self.pos + 1) % self.window
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self._resync()
+        else:
+            self._add(x, y, 1.0)
+        self._fit(x, y)
+        return self.zscore
+
+    def _fit(self, x, y):
+        n = self.count
+        # Means and population (co)variances of the window
+        dmx = self.sx / n
+        dmy = self.sy / n
+        cxx = self.sxx / n - dmx * dmx
+        cyy = self.syy / n - dmy * dmy
+        cxy = self.sxy / n - dmx * dmy
+        mx = self.kx + dmx
+        my = self.ky + dmy
+        self._set_fit(x, y, mx, my, cxx, cyy, cxy)
+
+    def _set_fit(self, x, y, mx, my, cxx, cyy, cxy):
+        """
+        Sets beta, alpha, residual and zscore from the (weighted) means
+        and population (co)variances of x and y.
+        """
+
+        if self.fit_intercept:
+            beta = cxy / cxx if cxx > 0 else np.nan
+            alpha = my - beta * mx
+        else:
+            sxx = cxx + mx * mx
+            beta = (cxy + mx * my) / sxx if sxx > 0 else np.nan
+            alpha = 0.0
+        self.beta = beta
+        self.alpha = alpha
+        self.residual = y - alpha - beta * x
+        mean = my - alpha - beta * mx
+        var = cyy - 2.0 * beta * cxy + beta * beta * cxx
+        self.zscore = (self.residual - mean) / math.sqrt(var) if var > 0 else np.nan
+
+
+class EWRollingOLS(RollingOLS):
+    """
+    Exponentially weighted variant of RollingOLS: the means and
+    (co)variances decay with weight alpha per observation
+    (alpha = 2 / (span + 1) when span is given), so recent ticks
+    dominate the hedge ratio without a hard window edge.
+    """
+
+    def __init__(self, span=None, alpha=None, fit_intercept=False, min_periods=1):
+        """
+        Parameters:
+        span, alpha - The decay, give one of them
+        fit_intercept - Whether to fit an intercept
+        min_periods - The number of observations before the fit is ready
+        """
+
+        if alpha is None:
+            if span is None:
+                raise ValueError("Either span or alpha is required")
+            alpha = 2.0 / (span + 1.0)
+        # The windowed buffers of RollingOLS are not used here, so they
+        # are created at the smallest window; only the exponentially
+        # weighted state below replaces the parent's sums
+        super(EWRollingOLS, self).__init__(2, fit_intercept)
+        self.decay = alpha
+        self.min_periods = min_periods
+        self.mx = self.my = 0.0
+        self.cxx = self.cyy = self.cxy = 0.0
+
+    @property
+    def ready(self):
+        return self.count >= self.min_periods
+
+    def update(self, x, y):
+        if x != x or y != y:
+            return self.zscore
+        a = self.decay
+        if self.count == 0:
+            self.mx, self.my = x, y
+        else:
+            dx = x - self.mx
+            dy = y - self.my
+            self.mx += a * dx
+            self.my += a * dy
+            b = 1.0 - a
+            self.cxx = b * (self.cxx + a * dx * dx)
+            self.cyy = b * (self.cyy + a * dy * dy)
+            self.cxy = b * (self.cxy + a * dx * dy)
+        self.count += 1
+        self._set_fit(x, y, self.mx, self.my, self.cxx, self.cyy, self.cxy)
+        return self.zscore
+
+
+class KalmanRegression(object):
+    """
+    Kalman filter estimate of a time-varying regression of y on x,
+    treating the coefficients as a random walk. delta sets how fast the
+    coefficients may drift (the state noise is delta / (1 - delta)),
+    obs_var is the observation noise. zscore is the forecast error of
+    the newest observation divided by its predicted standard deviation.
+    """
+
+    def __init__(self, delta=1e-4, obs_var=1e-3, fit_intercept=False, min_periods=1):
+        """
+        Parameters:
+        delta - The coefficient drift rate, between 0 and 1
+        obs_var - The observation noise variance
+        fit_intercept - Whether to estimate an intercept as a second state
+        min_periods - The number of observations before the fit is ready
+        """
+
+        k = 2 if fit_intercept else 1
+        self.fit_intercept = fit_intercept
+        self.state_var = delta / (1.0 - delta) * np.eye(k)
+        self.obs_var = obs_var
+        self.min_periods = min_periods
+        self.theta = np.zeros(k)
+        self.P = np.zeros((k, k))
+        self.count = 0
+        self.beta = self.alpha = self.residual = self.zscore = np.nan
+
+    @property
+    def ready(self):
+        return self.count >= self.min_periods
+
+    def update(self, x, y):
+        if x != x or y != y:
+            return self.zscore
+        F = np.array([x, 1.0]) if self.fit_intercept else np.array([x])
+        R = self.P + self.state_var
+        error = y - F.dot(self.theta)
+        Q = F.dot(R).dot(F) + self.obs_var
+        K = R.dot(F) / Q
+        self.theta = self.theta + K * error
+        self.P = R - np.outer(K, F).dot(R)
+        self.count += 1
+        self.beta = self.theta[0]
+        self.alpha = self.theta[1] if self.fit_intercept else 0.0
+        self.residual = error
+        self.zscore = error / math.sqrt(Q)
+        return self.zscore
+
+
+def rolling_ols(x, y, window, fit_intercept=False):
+    """
+    Vectorised counterpart of RollingOLS over whole arrays: returns the
+    beta, alpha and zscore RollingOLS would hold after each update.
+    Pairs containing NaN are skipped as in RollingOLS.update, so their
+    positions repeat the previous values; positions before the first
+    full window are NaN. The windowed sums come from cumulative sums of
+    values shifted by their overall mean.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    xv, yv = x[valid], y[valid]
+    beta, alpha, zscore = (np.full(len(xv), np.nan) for _ in range(3))
+    if len(xv) >= window:
+        dx = xv - xv.mean()
+        dy = yv - yv.mean()
+
+        def window_mean(v):
+            total = np.concatenate(([0.0], np.cumsum(v)))
+            return (total[window:] - total[:-window]) / window
+
+        dmx = window_mean(dx)
+        dmy = window_mean(dy)
+        cxx = window_mean(dx * dx) - dmx * dmx
+        cyy = window_mean(dy * dy) - dmy * dmy
+        cxy = window_mean(dx * dy) - dmx * dmy
+        mx = xv.mean() + dmx
+        my = yv.mean() + dmy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if fit_intercept:
+                b = np.where(cxx > 0, cxy / cxx, np.nan)
+                a = my - b * mx
+            else:
+                sxx = cxx + mx * mx
+                b = np.where(sxx > 0, (cxy + mx * my) / sxx, np.nan)
+                a = np.zeros_like(b)
+            residual = yv[window - 1:] - a - b * xv[window - 1:]
+            var = cyy - 2.0 * b * cxy + b * b * cxx
+            z = np.where(var > 0, (residual - (my - a - b * mx)) / np.sqrt(var), np.nan)
+        beta[window - 1:] = b
+        alpha[window - 1:] = a
+        zscore[window - 1:] = z
+
+    results = []
+    position = np.cumsum(valid) - 1
+    for values in (beta, alpha, zscore):
+        full = np.full(len(x), np.nan)
+        seen = position >= 0
+        full[seen] = values[position[seen]]
+        results.append(full)
+    return tuple(results)
+
+
+if __name__ == "__main__":
+    import time
+    import statsmodels.api as sm
+
+    rng = np.random.default_rng(0)
+    n, window = 3000, 100
+    x = 3000.0 + np.cumsum(rng.normal(0, 1, n))
+    y = 0.8 * x + 500.0 + rng.normal(0, 2, n)
+
+    for fit_intercept in (False, True):
+        ols = RollingOLS(window, fit_intercept=fit_intercept)
+        err = 0.0
+        elapsed = 0.0
+        for t in range(n):
+            t0 = time.time()
+            ols.update(x[t], y[t])
+            elapsed += time.time() - t0
+            if t >= window and t % 97 == 0:
+                xw, yw = x[t + 1 - window:t + 1], y[t + 1 - window:t + 1]
+                params = sm.OLS(yw, sm.add_constant(xw) if fit_intercept else xw).fit().params
+                err = max(err, abs(ols.beta - params[-1 if fit_intercept else 0]))
+                spread = yw - ols.alpha - ols.beta * xw
+                err = max(err, abs(ols.zscore - ((spread - spread.mean()) / spread.std())[-1]))
+        print("fit_intercept=%s: max error vs sm.OLS %.2e, %.2fus per update"
+              % (fit_intercept, err, elapsed / n * 1e6))
+
+    for fit_intercept in (False, True):
+        ols = RollingOLS(window, fit_intercept=fit_intercept)
+        zscore = np.array([ols.update(x[t], y[t]) for t in range(n)])
+        print("rolling_ols fit_intercept=%s: max error vs RollingOLS %.2e"
+              % (fit_intercept, np.nanmax(np.abs(rolling_ols(x, y, window, fit_intercept)[2] - zscore))))
+
+    t0 = time.time()
+    for t in range(window, window + 500):
+        sm.OLS(y[t - window:t], x[t - window:t]).fit()
+    print("sm.OLS refit: %.2fus per update" % ((time.time() - t0) / 500 * 1e6))
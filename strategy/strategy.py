@@ -12,7 +12,7 @@ except ImportError:
 import numpy as np
 import pandas as pd
 
-from event import SignalEvent
+from event import MarketEvent, SignalEvent
 
 
 class Strategy(object):
@@ -28,6 +28,10 @@ class Strategy(object):
     """
     __metaclass__ = ABCMeta
 
+    # Sent with every SignalEvent; Backtest sets a distinct id for each
+    # strategy so that signals reach the strategy's own Portfolio
+    strategy_id = 1
+
     @abstractmethod
     def calculate_signals(self):
         """
@@ -35,3 +39,44 @@ class Strategy(object):
         """
 
         raise NotImplementedError("Should implement calculate_signals()")
+
+    def subscribe(self, events):
+        """
+        Registers calculate_signals for MarketEvents on the event bus.
+        A strategy using an IndicatorRegistry (self.indicators) has the
+        registry subscribed first, so its indicators are up to date when
+        calculate_signals runs.
+        """
+
+        indicators = getattr(self, 'indicators', None)
+        if indicators is not None:
+            indicators.subscribe(events)
+        events.subscribe(MarketEvent, self.calculate_signals)
+
+
+class VectorizedStrategy(object):
+    """
+    VectorizedStrategy is the abstract base class for strategies run
+    by VectorizedBacktest. Instead of reacting to one MarketEvent at a
+    time, it computes the signals of the whole backtest at once from
+    the tick arrays, as a (derived) Strategy would have emitted them.
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, data):
+        """
+        Parameters:
+        data - The BarArrays of the backtest, one row per MarketEvent
+        """
+
+        self.data = data
+        self.symbol_list = data.symbol_list
+
+    @abstractmethod
+    def generate_signals(self):
+        """
+        Returns a (ticks, symbols) float array with the SignalType value
+        of the signal sent for each symbol at each tick, NaN for none.
+        """
+
+        raise NotImplementedError("Should implement generate_signals()")
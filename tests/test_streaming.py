@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+# test_streaming.py
+
+from __future__ import print_function
+
+import os, os.path
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from data import HistoricCSVDataHandler, StreamingCSVDataHandler
+from event import EventBus
+
+
+def _write_ticks(path, day, start, step, n, price):
+    """
+    写入一个聚宽格式的合成tick文件：从day start开始每step秒一条，共n条
+    """
+
+    times = pd.Timestamp(day + ' ' + start) + pd.to_timedelta(np.arange(n) * step, unit='s')
+    current = price + np.round(np.sin(np.arange(n) / 7.0) * 10.0)
+    frame = pd.DataFrame({'time': times.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3],
+                          'current': current, 'high': current + 5.0, 'low': current - 5.0,
+                          'volume': np.arange(n) * 2.0, 'money': np.arange(n) * 2.0 * price,
+                          'position': 100000 + np.arange(n), 'a1_v': 10, 'a1_p': current + 1.0,
+                          'b1_v': 12, 'b1_p': current - 1.0})
+    frame.to_csv(path)
+
+
+class AlignedStreamingTest(unittest.TestCase):
+    """
+    align=True、dedup=True的StreamingCSVDataHandler应与HistoricCSVDataHandler的配对数据逐条一致
+    """
+
+    def setUp(self):
+        self.csv_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.csv_dir, ignore_errors=True)
+
+    def _compare(self, symbol_list):
+        pairs = HistoricCSVDataHandler(EventBus(), self.csv_dir, symbol_list, use_cache=False)
+        stream = StreamingCSVDataHandler(EventBus(), self.csv_dir, symbol_list, lookback=1, chunksize=97,
+                                         dedup=True, align=True)
+        steps = len(pairs.symbol_data[symbol_list[0]]['time'])
+        times = dict((s, []) for s in symbol_list)
+        prices = dict((s, []) for s in symbol_list)
+        while True:
+            stream.update_bars()
+            if not stream.continue_backtest:
+                break
+            for s in symbol_list:
+                times[s].append(stream.get_latest_bar_datetime(s))
+                prices[s].append(stream.get_latest_bar_value(s, 'current'))
+        for s in symbol_list:
+            self.assertEqual(len(times[s]), steps)
+            np.testing.assert_array_equal(times[s], pairs.symbol_data[s]['time'])
+            np.testing.assert_array_equal(prices[s], pairs.symbol_data[s]['current'])
+        return times
+
+    def test_same_day_pair(self):
+        _write_ticks(os.path.join(self.csv_dir, 'M2001_2019-11-05.csv'), '2019-11-05', '09:00:00.100', 0.5, 900, 2800.0)
+        _write_ticks(os.path.join(self.csv_dir, 'RM2001_2019-11-05.csv'), '2019-11-05', '09:00:02.300', 1.3, 400,
+                     2200.0)
+        self._compare(['M2001_2019-11-05', 'RM2001_2019-11-05'])
+
+    def test_different_day_pair(self):
+        _write_ticks(os.path.join(self.csv_dir, 'A2001_2019-11-05.csv'), '2019-11-05', '09:00:00.100', 0.5, 900, 3500.0)
+        _write_ticks(os.path.join(self.csv_dir, 'A2001_2019-11-06.csv'), '2019-11-06', '09:00:01.700', 0.7, 800,
+                     3510.0)
+        times = self._compare(['A2001_2019-11-05', 'A2001_2019-11-06'])
+        # 按交易时段对齐，各品种保留自身日期
+        day = 24 * 60 * 60 * 10 ** 9
+        self.assertTrue(all(t // day == times['A2001_2019-11-05'][0] // day for t in times['A2001_2019-11-05']))
+        self.assertTrue(all(t // day == times['A2001_2019-11-06'][0] // day for t in times['A2001_2019-11-06']))
+        self.assertEqual(times['A2001_2019-11-06'][-1] - times['A2001_2019-11-05'][-1], day)
+        self.assertLess(len(times['A2001_2019-11-05']), 900 // 2 + 800)
+
+
+if __name__ == '__main__':
+    unittest.main()